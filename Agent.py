@@ -17,24 +17,24 @@ class Agent:
 
     def heuristic(self, env: WarehouseEnv, robot_id: int):
         robot = env.get_robot(robot_id)
-        other_robot = env.get_robot((robot_id + 1) % 2)
-        return robot.credit - other_robot.credit
+        return robot.credit - max(other.credit for i, other in enumerate(env.robots) if i != robot_id)
 
 
 # picks random operators from the legal ones
 class AgentRandom(Agent):
     def run_step(self, env: WarehouseEnv, robot_id, time_limit):
-        operators, _ = self.successors(env, robot_id)
+        operators = env.get_legal_operators(robot_id)
         return random.choice(operators)
 
 
 class AgentGreedy(Agent):
     def run_step(self, env: WarehouseEnv, robot_id, time_limit):
         operators = env.get_legal_operators(robot_id)
-        children = [env.clone() for _ in operators]
-        for child, op in zip(children, operators):
-            child.apply_operator(robot_id, op)
-        children_heuristics = [self.heuristic(child, robot_id) for child in children]
+        children_heuristics = []
+        for op in operators:
+            record = env.apply_operator(robot_id, op)
+            children_heuristics.append(self.heuristic(env, robot_id))
+            env.undo_operator(record)
         max_heuristic = max(children_heuristics)
         index_selected = children_heuristics.index(max_heuristic)
         return operators[index_selected]
@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import struct
+import time
+
+from Agent import Agent
+from agents import agents, make_agent
+from submission import RBAgent
+from WarehouseEnv import WarehouseEnv, ChargeStation, operator_code, operator_name
+
+# board size, robot count, package_count, length of the package list, charge station count, num_steps and seed
+ENV = struct.Struct('<HBBBBIH')
+# position, battery, credit and whether a package is carried, which follows as a PACKAGE
+ROBOT = struct.Struct('<HHIIB')
+# position, destination and whether it is on the board
+PACKAGE = struct.Struct('<HHHHB')
+STATION = struct.Struct('<HH')
+
+# every message is a LENGTH prefixed body whose first byte is its kind. a client says HELLO with the agent's name and
+# gets OK, then sends a STEP of the robot, the time limit and a packed position for each turn and gets the MOVE's
+# operator code. ERROR carries a description instead of OK or MOVE, after which the server closes the connection
+LENGTH = struct.Struct('<I')
+HELLO, OK, STEP, MOVE, ERROR = b'H', b'K', b'S', b'M', b'E'
+STEP_ARGS = struct.Struct('<Bd')
+DEFAULT_PORT = 7341
+
+
+def pack_env(env: WarehouseEnv):
+    parts = [ENV.pack(env.board.size, len(env.robots), env.package_count, len(env.packages),
+                      len(env.charge_stations), env.num_steps, env.seed)]
+    for robot in env.robots:
+        parts.append(ROBOT.pack(*robot.position, robot.battery, robot.credit, robot.package is not None))
+        if robot.package is not None:
+            parts.append(pack_package(robot.package))
+    parts += [pack_package(package) for package in env.packages]
+    parts += [STATION.pack(*station.position) for station in env.charge_stations]
+    return b''.join(parts)
+
+
+def pack_package(package):
+    return PACKAGE.pack(*package.position, *package.destination, package.on_board)
+
+
+def unpack_env(data):
+    size, robots, package_count, packages, stations, num_steps, seed = ENV.unpack_from(data)
+    offset = ENV.size
+    env = WarehouseEnv(size)
+    env.num_steps = num_steps
+    env.seed = seed
+    env.package_count = package_count
+    env.robots = []
+    for _ in range(robots):
+        x, y, battery, credit, carrying = ROBOT.unpack_from(data, offset)
+        offset += ROBOT.size
+        robot = env.new_robot((x, y), battery, credit)
+        if carrying:
+            robot.package = unpack_package(env, data, offset)
+            offset += PACKAGE.size
+        env.robots.append(robot)
+    env.packages = []
+    for _ in range(packages):
+        env.packages.append(unpack_package(env, data, offset))
+        offset += PACKAGE.size
+    env.charge_stations = [ChargeStation(STATION.unpack_from(data, offset + i * STATION.size)) for i in range(stations)]
+    env.index_stations()
+    env.index_robots()
+    env.index_packages()
+    env.zobrist = env.full_zobrist()
+    return env
+
+
+def unpack_package(env: WarehouseEnv, data, offset):
+    x, y, destination_x, destination_y, on_board = PACKAGE.unpack_from(data, offset)
+    package = env.new_package((x, y), (destination_x, destination_y))
+    package.on_board = bool(on_board)
+    return package
+
+
+# runs in each worker process: the agents of the sessions assigned to it take their turns here, one request at a
+# time. a search agent outlives its game, it waits with its transposition table and loaded tables for the next game
+# of its kind, and begin_turn starts it on the new game. the other agents keep per game state, like AgentHardCoded's
+# step in its script, so each game gets a new one
+def _agent_worker(connection):
+    # agent name -> search agents of closed sessions
+    idle = {}
+    # session -> (agent name, agent)
+    sessions = {}
+    while True:
+        message = connection.recv()
+        if message is None:
+            return
+        if message[0] == 'open':
+            _, session, agent_name = message
+            waiting = idle.get(agent_name)
+            sessions[session] = agent_name, waiting.pop() if waiting else make_agent(agent_name)
+        elif message[0] == 'close':
+            agent_name, agent = sessions.pop(message[1])
+            if isinstance(agent, RBAgent):
+                idle.setdefault(agent_name, []).append(agent)
+        else:
+            _, session, request, data, robot, deadline = message
+            try:
+                operator = sessions[session][1].run_step(unpack_env(data), robot, deadline - time.perf_counter())
+                connection.send((request, operator_code(operator), None))
+            except Exception as error:
+                connection.send((request, None, repr(error)))
+
+
+# hosts agents in persistent worker processes for clients that play their games elsewhere. every connection is one
+# robot's agent for one game, assigned to the worker with the fewest open connections. the time limit is enforced
+# here: the agent gets the step's time limit less margin, counted from when the step arrived, and the client is told
+# the agent used too much time if it has not answered margin / 2 before the limit
+class AgentServer(object):
+    def __init__(self, workers=1, margin=1e-2):
+        self.margin = margin
+        self.connections = []
+        self.processes = []
+        for _ in range(workers):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_agent_worker, args=(worker_connection,), daemon=True)
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+        self.sessions = [0] * workers
+        self.next_session = 0
+        # request -> (future for the worker's reply, or None once the step timed out, worker index)
+        self.pending = {}
+        self.next_request = 0
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT, path=None):
+        loop = asyncio.get_running_loop()
+        for worker, connection in enumerate(self.connections):
+            loop.add_reader(connection.fileno(), self.receive, worker)
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def receive(self, worker):
+        try:
+            request, code, error = self.connections[worker].recv()
+        except (EOFError, OSError):
+            # a dead worker fails the steps it was taking
+            asyncio.get_running_loop().remove_reader(self.connections[worker].fileno())
+            for request, (future, owner) in list(self.pending.items()):
+                if owner == worker:
+                    del self.pending[request]
+                    if future is not None:
+                        future.set_result((None, 'agent process died'))
+            return
+        future, worker = self.pending.pop(request)
+        if future is not None:
+            future.set_result((code, error))
+        else:
+            # the reply to a step that timed out, its session closed and only now stops keeping the worker busy
+            self.sessions[worker] -= 1
+
+    async def handle(self, reader, writer):
+        worker = self.sessions.index(min(self.sessions))
+        connection = self.connections[worker]
+        session = self.next_session
+        self.next_session += 1
+        opened = timed_out = False
+        try:
+            message = await read_message(reader)
+            if message is None or message[:1] != HELLO:
+                return
+            agent_name = message[1:].decode('utf-8')
+            if agent_name not in agents:
+                write_message(writer, ERROR + ('unknown agent ' + agent_name).encode('utf-8'))
+                return
+            connection.send(('open', session, agent_name))
+            self.sessions[worker] += 1
+            opened = True
+            write_message(writer, OK)
+            while True:
+                message = await read_message(reader)
+                if message is None or message[:1] != STEP:
+                    return
+                received = time.perf_counter()
+                robot, time_limit = STEP_ARGS.unpack_from(message, 1)
+                request = self.next_request
+                self.next_request += 1
+                future = asyncio.get_running_loop().create_future()
+                self.pending[request] = future, worker
+                connection.send(('step', session, request, message[1 + STEP_ARGS.size:], robot,
+                                 received + time_limit - self.margin))
+                try:
+                    code, error = await asyncio.wait_for(future, received + time_limit - self.margin / 2
+                                                         - time.perf_counter())
+                except asyncio.TimeoutError:
+                    self.pending[request] = None, worker
+                    timed_out = True
+                    code, error = None, 'Agent used too much time!'
+                if error is not None:
+                    write_message(writer, ERROR + error.encode('utf-8'))
+                    return
+                write_message(writer, MOVE + bytes((code,)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if opened:
+                # queued behind a step that timed out, the agent is only reused once it finished
+                connection.send(('close', session))
+                if not timed_out:
+                    self.sessions[worker] -= 1
+            writer.close()
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+        for process in self.processes:
+            process.join(1)
+
+
+async def read_message(reader):
+    try:
+        header = await reader.readexactly(LENGTH.size)
+    except asyncio.IncompleteReadError:
+        return None
+    return await reader.readexactly(LENGTH.unpack(header)[0])
+
+
+def write_message(writer, body):
+    writer.write(LENGTH.pack(len(body)) + body)
+
+
+# "HOST:PORT" or the path of a unix socket
+def parse_address(address):
+    host, separator, port = address.rpartition(':')
+    if separator and port.isdigit():
+        return host or '127.0.0.1', int(port)
+    return address
+
+
+# plays a robot with an agent hosted by an AgentServer at address, see parse_address
+class RemoteAgent(Agent):
+    def __init__(self, address, agent_name):
+        address = parse_address(address)
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(address)
+        else:
+            self.socket = socket.create_connection(address)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.send(HELLO + agent_name.encode('utf-8'))
+        reply = self.receive()
+        if reply[:1] != OK:
+            raise RuntimeError(reply[1:].decode('utf-8'))
+
+    def run_step(self, env: WarehouseEnv, robot_id, time_limit):
+        self.send(STEP + STEP_ARGS.pack(robot_id, time_limit) + pack_env(env))
+        reply = self.receive()
+        if reply[:1] != MOVE:
+            raise RuntimeError(reply[1:].decode('utf-8'))
+        return operator_name(reply[1])
+
+    def send(self, body):
+        self.socket.sendall(LENGTH.pack(len(body)) + body)
+
+    def receive(self):
+        length = LENGTH.unpack(self.receive_exactly(LENGTH.size))[0]
+        return self.receive_exactly(length)
+
+    def receive_exactly(self, count):
+        data = bytearray()
+        while len(data) < count:
+            chunk = self.socket.recv(count - len(data))
+            if not chunk:
+                raise ConnectionError('the agent server closed the connection')
+            data += chunk
+        return bytes(data)
+
+    def close(self):
+        self.socket.close()
+
+
+def run_server():
+    parser = argparse.ArgumentParser(description='Host agents for main.py games played with remote-<agent> robots.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('-u', '--unix', help='Listen on this unix socket path instead of TCP')
+    parser.add_argument('-w', '--workers', type=int, default=multiprocessing.cpu_count(),
+                        help='Processes the agents run in, at least one per robot playing at a time keeps turns '
+                             'from waiting for each other')
+    parser.add_argument('--margin', type=float, default=1e-2,
+                        help='Seconds of every time limit kept for sending the move back')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    server = AgentServer(args.workers, args.margin)
+    print('serving on', args.unix or '%s:%d' % (args.host, args.port), 'with', args.workers, 'workers', flush=True)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    run_server()
@@ -0,0 +1,64 @@
+import importlib.util
+
+from WarehouseEnv import WarehouseEnv
+
+# numpy is imported by the first batch rather than with the agents, most processes never batch
+np = None
+
+
+# whether numpy can be imported, the agents batch only if it can
+def available():
+    return np is not None or importlib.util.find_spec('numpy') is not None
+
+
+# board size -> the board's distance table as an array
+_distances = {}
+
+
+def distance_array(board):
+    distances = _distances.get(board.size)
+    if distances is None:
+        distances = _distances[board.size] = np.array(board.distance, dtype=np.int64)
+    return distances
+
+
+# values of RBAgent.heuristic for every child reached by one of the operator codes of robot turn, in order.
+# a move changes nothing but the mover's cell, battery and num_steps, so the move children are evaluated
+# together from the parent's state and an array of target cells, without applying them. every other child
+# (and every child when the move ends the game) is applied and evaluated by leaf_value(env, turn, op).
+def children_heuristics(env: WarehouseEnv, turn, operators, agent_id, smart_heuristic, leaf_value):
+    global np
+    if np is None:
+        import numpy as np
+    mover = env.robots[turn]
+    moves = dict(env.board.moves[mover.cell])
+    ends_game = env.num_steps <= 1 or (mover.battery == 1 and all(
+        robot.battery <= 0 for i, robot in enumerate(env.robots) if i != turn))
+    move_indices = [] if ends_game else [i for i, op in enumerate(operators) if op in moves]
+    values = [None] * len(operators)
+
+    if move_indices:
+        cells = [moves[operators[i]] for i in move_indices]
+        if mover.package is not None:
+            distances = distance_array(env.board)
+            destination = mover.package.destination_cell
+            scores = mover.credit * 1000 + distances[mover.package.cell, destination] \
+                - distances[np.array(cells, dtype=np.int64), destination] + 100
+        else:
+            nearest = env.package_distance
+            scores = mover.credit * 1000 - np.array([nearest[cell] for cell in cells], dtype=np.int64)
+        # the paranoid value: the agent's heuristic minus the best of the other robots'
+        others = [smart_heuristic(env, i) for i in range(len(env.robots)) if i != agent_id and i != turn]
+        if turn == agent_id:
+            scores = scores - max(others)
+        else:
+            if others:
+                scores = np.maximum(scores, max(others))
+            scores = smart_heuristic(env, agent_id) - scores
+        for i, value in zip(move_indices, scores.tolist()):
+            values[i] = value
+
+    for i, op in enumerate(operators):
+        if values[i] is None:
+            values[i] = leaf_value(env, turn, op)
+    return values
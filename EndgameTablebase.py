@@ -0,0 +1,188 @@
+import argparse
+import os
+import random
+import struct
+
+from SlotTable import SlotTable
+from WarehouseEnv import WarehouseEnv, zobrist_key
+
+# game outcomes for robot 0, ordered so that robot 0 maximizes and robot 1 minimizes them
+LOSS = 1
+DRAW = 2
+WIN = 3
+
+MAGIC = b'WHTB'
+VERSION = 2
+# magic, version, slot count, entry count, largest num_steps and largest capped battery sum of any entry, and the
+# board size, robot count and package count of the games the table was solved for
+HEADER = struct.Struct('<4sIIIIIIII')
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'endgame.tb')
+
+
+# robot 0 moves when the plies left are a multiple of the robot count, as in main.py's games
+def turn_of(env: WarehouseEnv):
+    return -env.num_steps % len(env.robots)
+
+
+# battery beyond the robot's remaining turns + 1 can neither be spent nor run out before the game ends
+def capped_batteries(env: WarehouseEnv):
+    n, count, turn = env.num_steps, len(env.robots), turn_of(env)
+    return [min(robot.battery, (n - (i - turn) % count + count - 1) // count + 1) for i, robot in enumerate(env.robots)]
+
+
+# the game rules the zobrist hash does not tell apart
+def layout(env: WarehouseEnv):
+    return env.board.size, len(env.robots), env.package_count
+
+
+# env.zobrist with every battery replaced by its capped value, positions that differ only in unusable battery
+# get the same key
+def canonical_hash(env: WarehouseEnv, batteries):
+    h = env.zobrist
+    for i, robot in enumerate(env.robots):
+        if batteries[i] != robot.battery:
+            h ^= zobrist_key('battery', i, robot.battery) ^ zobrist_key('battery', i, batteries[i])
+    return h
+
+
+def outcome(env: WarehouseEnv):
+    credit0, credit1 = env.robots[0].credit, env.robots[1].credit
+    return WIN if credit0 > credit1 else LOSS if credit0 < credit1 else DRAW
+
+
+# exact outcomes of solved positions, read from a file of open addressing slots holding (key & ~3) | outcome
+class EndgameTablebase(SlotTable):
+    MAGIC = MAGIC
+    VERSION = VERSION
+    HEADER = HEADER
+    VALUE_BITS = 2
+    KIND = 'an endgame table'
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.max_steps = -1
+        self.max_battery = -1
+        self.layout = None
+        super().__init__(path)
+
+    def read_header(self, max_steps, max_battery, *table_layout):
+        self.max_steps = max_steps
+        self.max_battery = max_battery
+        self.layout = tuple(table_layout)
+
+    # whether a position up to plies moves away from env could be in the table
+    def may_contain(self, env: WarehouseEnv, plies=0):
+        if not self.loaded:
+            self.load()
+        return env.num_steps - plies <= self.max_steps and layout(env) == self.layout \
+            and sum(capped_batteries(env)) - plies <= self.max_battery
+
+    # the outcome for robot 0 of the game from env with best play by both robots, or None if it is not in the table
+    def probe(self, env: WarehouseEnv):
+        if not self.loaded:
+            self.load()
+        if env.num_steps > self.max_steps or layout(env) != self.layout:
+            return None
+        batteries = capped_batteries(env)
+        if sum(batteries) > self.max_battery:
+            return None
+        return self.lookup(canonical_hash(env, batteries))
+
+
+# solves every position reachable from env, a two robot game, that is not in solved yet, adding their outcomes to solved.
+# the positions are collected with their children walking forward, then solved backwards one num_steps layer
+# at a time, every child being one layer below its parent. raises OverflowError beyond max_states new positions.
+# returns the new positions' (count, largest num_steps, largest capped battery sum)
+def solve(env: WarehouseEnv, solved, max_states):
+    # key -> (num_steps, turn, child keys, outcomes of the children that end the game)
+    positions = {}
+    limits = [0, 0]
+    # [key, operators left to try, undo record of the one being tried] along the current line, games can be
+    # thousands of plies long when robots pick up, drop off and charge without spending battery
+    stack = []
+
+    def collect():
+        batteries = capped_batteries(env)
+        key = canonical_hash(env, batteries)
+        if key in solved or key in positions:
+            return key
+        if len(positions) >= max_states:
+            raise OverflowError('more than %d positions' % max_states)
+        turn = turn_of(env)
+        positions[key] = (env.num_steps, turn, [], [])
+        limits[0] = max(limits[0], env.num_steps)
+        limits[1] = max(limits[1], sum(batteries))
+        stack.append([key, iter(env.get_legal_codes(turn)), None])
+        return key
+
+    collect()
+    while stack:
+        frame = stack[-1]
+        if frame[2] is not None:
+            env.undo_operator(frame[2])
+            frame[2] = None
+        op = next(frame[1], None)
+        if op is None:
+            stack.pop()
+            continue
+        num_steps, turn, children, ends = positions[frame[0]]
+        frame[2] = env.apply_code(turn, op)
+        if env.done():
+            ends.append(outcome(env))
+        else:
+            children.append(collect())
+    for key, (num_steps, turn, children, ends) in sorted(positions.items(), key=lambda item: item[1][0]):
+        outcomes = ends + [solved[child] for child in children]
+        solved[key] = max(outcomes) if turn == 0 else min(outcomes)
+    return len(positions), limits[0], limits[1]
+
+
+# endgame roots are taken from playouts of the given agents: walking back from the end of each game, every
+# position is solved until one has more than max_states new positions reachable from it
+def generate_table():
+    from submission import AgentGreedyImproved
+    from Agent import AgentGreedy, AgentRandom
+    agents = {'greedyImproved': AgentGreedyImproved, 'greedy': AgentGreedy, 'random': AgentRandom}
+
+    parser = argparse.ArgumentParser(description='Solve game endings by retrograde analysis into an endgame table.')
+    parser.add_argument('-s', '--seeds', nargs='+', type=int, default=list(range(256)),
+                        help='Seeds of the games to take endgame positions from')
+    parser.add_argument('-c', '--count_steps', type=int, default=4761)
+    parser.add_argument('-a', '--agents', nargs=2, default=['greedyImproved', 'greedyImproved'], choices=list(agents),
+                        help='The agents playing robot 0 and robot 1 in the playouts')
+    parser.add_argument('-m', '--max_states', type=int, default=100000,
+                        help='Largest number of new positions solved from a single root')
+    parser.add_argument('-o', '--output', default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    solved = {}
+    max_steps = max_battery = 0
+    table_layout = None
+    for seed in args.seeds:
+        random.seed(seed)
+        env = WarehouseEnv()
+        env.generate(seed, 2 * args.count_steps)
+        table_layout = layout(env)
+        players = [agents[name]() for name in args.agents]
+        history = []
+        while not env.done():
+            history.append(env.clone())
+            turn = turn_of(env)
+            env.apply_operator(turn, players[turn].run_step(env, turn, 1))
+        roots = 0
+        for root in reversed(history):
+            try:
+                count, steps, battery = solve(root, solved, args.max_states)
+            except OverflowError:
+                break
+            roots += 1
+            if count:
+                max_steps, max_battery = max(max_steps, steps), max(max_battery, battery)
+        print('seed', seed, 'solved the last', roots, 'of', len(history), 'positions,', len(solved), 'in table',
+              flush=True)
+
+    EndgameTablebase.write(args.output, solved, max_steps, max_battery, *table_layout)
+    print('wrote', len(solved), 'positions to', args.output)
+
+
+if __name__ == "__main__":
+    generate_table()
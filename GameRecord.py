@@ -0,0 +1,147 @@
+import argparse
+import mmap
+import os
+import struct
+
+from WarehouseEnv import WarehouseEnv, board_size, operator_code, operator_name
+
+MAGIC = b'WHGR'
+VERSION = 1
+# magic, version, robot count, board size, package count, charge station count, seed, count_steps, byte length of
+# the agent names and ply count. the comma separated agent names follow, then one operator code per ply, robot
+# ply % robot count moving in each
+HEADER = struct.Struct('<4sBBHBBqIHI')
+
+
+# a game as it was played: the arguments main.py generated it with and the operator codes of its plies. a game
+# that raised part way has the plies up to the last one applied
+class GameRecord(object):
+    def __init__(self, seed, count_steps, agent_names, codes, size, package_count=2, station_count=2):
+        self.seed = seed
+        self.count_steps = count_steps
+        self.agent_names = agent_names
+        self.codes = codes
+        self.size = size
+        self.package_count = package_count
+        self.station_count = station_count
+
+    def __len__(self):
+        return len(self.codes)
+
+    def to_bytes(self):
+        names = ','.join(self.agent_names).encode('utf-8')
+        return HEADER.pack(MAGIC, VERSION, len(self.agent_names), self.size, self.package_count, self.station_count,
+                           self.seed, self.count_steps, len(names), len(self.codes)) + names + bytes(self.codes)
+
+    def start(self):
+        env = WarehouseEnv(self.size)
+        robots = len(self.agent_names)
+        env.generate(self.seed, robots * self.count_steps, robots, self.package_count, self.station_count)
+        return env
+
+    # the game after its first plies plies, all of them by default. the codes were legal when recorded, so they
+    # are applied without apply_operator's checks
+    def replay(self, plies=None):
+        env = self.start()
+        robots = len(self.agent_names)
+        for ply, code in enumerate(self.codes[:plies]):
+            env.apply_code(ply % robots, code)
+        return env
+
+    # (ply, position) every interval plies from the start, each position a copy of its own
+    def positions(self, interval=1):
+        env = self.start()
+        robots = len(self.agent_names)
+        for ply, code in enumerate(self.codes):
+            if ply % interval == 0:
+                yield ply, env.clone()
+            env.apply_code(ply % robots, code)
+        if len(self.codes) % interval == 0:
+            yield len(self.codes), env
+
+    def operators(self):
+        return [operator_name(code) for code in self.codes]
+
+
+# collects a game's operators as it is played and appends its record to the file at path with a single write once
+# closed, so the games of a tournament's processes can share one file
+class GameWriter(object):
+    def __init__(self, path, seed, count_steps, agent_names, env: WarehouseEnv):
+        self.path = path
+        self.record = GameRecord(seed, count_steps, list(agent_names), bytearray(), env.board.size,
+                                 env.package_count, len(env.charge_stations))
+
+    def append(self, operator):
+        self.record.codes.append(operator_code(operator))
+
+    def close(self):
+        # unbuffered, the record goes to the end of the file in one system call
+        with open(self.path, 'ab', buffering=0) as f:
+            f.write(self.record.to_bytes())
+
+
+# the records of a file one after another. only the headers are parsed, so scanning thousands of games to pick
+# positions from is fast
+def read_records(path):
+    if os.path.getsize(path) == 0:
+        return
+    # the records hold copies of their bytes, the mapping is closed once the scan stops
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        offset = 0
+        while offset < len(data):
+            magic, version, robots, size, packages, stations, seed, count_steps, names_length, plies = \
+                HEADER.unpack_from(data, offset)
+            assert magic == MAGIC and version == VERSION, '%s has no game record at byte %d' % (path, offset)
+            offset += HEADER.size
+            agent_names = data[offset:offset + names_length].decode('utf-8').split(',')
+            offset += names_length
+            assert len(agent_names) == robots, '%s has a damaged game record at byte %d' % (path, offset)
+            yield GameRecord(seed, count_steps, agent_names, data[offset:offset + plies], size, packages, stations)
+            offset += plies
+
+
+def show_records():
+    parser = argparse.ArgumentParser(description='List the games of a record file or replay one of them.')
+    parser.add_argument('path')
+    parser.add_argument('-g', '--game', type=int, help='Index of the game in the file to replay')
+    parser.add_argument('-p', '--ply', type=int, help='Print the board after this many plies of the game instead '
+                                                      'of every ply')
+    parser.add_argument('--frames', help='Render every ply of the game off screen to PNGs in this directory instead '
+                                         'of printing it')
+    args = parser.parse_args()
+
+    if args.game is None:
+        for i, record in enumerate(read_records(args.path)):
+            print('game', i, 'seed', record.seed, record.agent_names, len(record), 'plies',
+                  record.replay().get_balances())
+        return
+    record = next((record for i, record in enumerate(read_records(args.path)) if i == args.game), None)
+    if record is None:
+        parser.error('%s has no game %d' % (args.path, args.game))
+    if args.frames is not None:
+        if len(record.agent_names) != 2 or record.size != board_size or record.package_count != 2:
+            parser.error('--frames draws the default 5x5 board with two robots and two packages')
+        # pygame is only imported when frames are rendered
+        from WarehouseRenderer import WarehouseRenderer
+        renderer = WarehouseRenderer(None, True, args.frames)
+        for ply, env in record.positions():
+            renderer.render(env)
+        print('rendered', len(record) + 1, 'frames to', args.frames)
+        return
+    if args.ply is not None:
+        env = record.replay(args.ply)
+        print('board after', args.ply, 'plies:')
+        env.print()
+        return
+    env = record.start()
+    print('initial board:')
+    env.print()
+    robots = len(record.agent_names)
+    for ply, operator in enumerate(record.operators()):
+        env.apply_operator(ply % robots, operator)
+        print('robot ' + str(ply % robots) + ' chose ' + operator)
+        env.print()
+
+
+if __name__ == "__main__":
+    show_records()
@@ -0,0 +1,121 @@
+import argparse
+import math
+import os
+import random
+import struct
+import time
+
+from EndgameTablebase import layout, turn_of
+from SlotTable import SlotTable
+from WarehouseEnv import WarehouseEnv, zobrist_key, operator_code, operator_name
+
+MAGIC = b'WHOB'
+VERSION = 1
+# magic, version, slot count, entry count, plies the search of every entry looked ahead, and the board size, robot
+# count and package count of the games the book was built for
+HEADER = struct.Struct('<4sIIIIIII')
+
+
+# an agent class's book is found next to this file, AgentAlphaBeta's in AgentAlphaBeta.book
+def book_path(agent_name):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), agent_name + '.book')
+
+
+# the position with robot agent_id to move, whatever the number of steps left: a search that cannot reach the end
+# of the game chooses the same operator either way
+def book_key(env: WarehouseEnv, agent_id):
+    return env.zobrist ^ zobrist_key('steps', env.num_steps) ^ zobrist_key('turn', agent_id, agent_id)
+
+
+# the operators a deep search chose in opening positions, read from a file of open addressing slots holding
+# (key & ~7) | operator code
+class OpeningBook(SlotTable):
+    MAGIC = MAGIC
+    VERSION = VERSION
+    HEADER = HEADER
+    VALUE_BITS = 3
+    KIND = 'an opening book'
+
+    def __init__(self, path):
+        self.depth = 0
+        self.layout = None
+        super().__init__(path)
+
+    def read_header(self, depth, *book_layout):
+        self.depth = depth
+        self.layout = tuple(book_layout)
+
+    # the book's operator for robot agent_id in env, or None when env is not in the book or so close to the end of
+    # the game that the book's search would have seen it
+    def probe(self, env: WarehouseEnv, agent_id):
+        if not self.loaded:
+            self.load()
+        if self.data is None or env.num_steps <= self.depth or layout(env) != self.layout:
+            return None
+        code = self.lookup(book_key(env, agent_id))
+        return None if code is None else operator_name(code)
+
+
+# every initial board a seed gives is searched, and the positions every line of its first plies plies leads to.
+# a book that already exists at the output path is extended with the positions it is missing, when it was built
+# with the same depth
+def build_book():
+    import submission
+    agents = {'minimax': submission.AgentMinimax, 'alphabeta': submission.AgentAlphaBeta,
+              'expectimax': submission.AgentExpectimax}
+
+    parser = argparse.ArgumentParser(description='Search the opening positions of every seed deeply into an opening '
+                                                 'book that the agent then plays from.')
+    parser.add_argument('-a', '--agent', default='alphabeta', choices=list(agents))
+    parser.add_argument('-s', '--seeds', nargs='+', type=int, default=list(range(256)),
+                        help='Seeds of the initial boards, main.py draws them from 0 to 255')
+    parser.add_argument('-c', '--count_steps', type=int, default=4761)
+    parser.add_argument('-p', '--plies', type=int, default=2, help='Number of opening plies in the book')
+    parser.add_argument('-d', '--depth', type=int, default=40, help='Depth of the search of every position')
+    parser.add_argument('-o', '--output', help='The book file, by default the one the agent reads')
+    args = parser.parse_args()
+    agent_class = agents[args.agent]
+    output = args.output or book_path(agent_class.__name__)
+
+    existing = OpeningBook(output)
+    existing.load()
+    book = existing.items() if existing.depth == args.depth + 1 else {}
+    # the book is written over at the end
+    existing.close()
+    book_layout = None
+    start = time.perf_counter()
+    for seed in args.seeds:
+        env = WarehouseEnv()
+        env.generate(seed, 2 * args.count_steps)
+        book_layout = layout(env)
+        searched = 0
+        # (position, its ply) of the lines still to extend
+        stack = [(env, 0)]
+        while stack:
+            env, ply = stack.pop()
+            turn = turn_of(env)
+            key = book_key(env, turn) >> 3 << 3
+            if key not in book:
+                random.seed(0)
+                agent = agent_class()
+                agent.begin_turn(env, time.perf_counter(), math.inf)
+                # shallower depths first fill the transposition table and order the root
+                for depth in range(args.depth + 1):
+                    operator = agent.search(env.clone(), turn, depth)
+                book[key] = operator_code(operator)
+                searched += 1
+            if ply + 1 < args.plies:
+                for operator in env.get_legal_operators(turn):
+                    child = env.clone()
+                    child.apply_operator(turn, operator)
+                    if not child.done():
+                        stack.append((child, ply + 1))
+        print('seed', seed, 'searched', searched, 'positions,', len(book), 'in book after',
+              '%.0fs' % (time.perf_counter() - start), flush=True)
+
+    OpeningBook.write(output, book, args.depth + 1, *book_layout)
+    print('wrote', len(book), 'positions to', output)
+
+
+if __name__ == "__main__":
+    build_book()
@@ -0,0 +1,265 @@
+from WarehouseEnv import WarehouseEnv, ChargeStation, get_board, OPERATORS, PARK, CHARGE, PICK_UP, DROP_OFF
+
+# the whole state of a game on the default layout main.py plays (5x5 board, 2 robots, 2 packages on the board at
+# a time and 2 charge stations) in one int of STATE_BITS bits, low bits first:
+#   2 robots of ROBOT_BITS: cell, battery, credit, whether it carries a package, the carried package's cell and
+#       destination cell
+#   the package list, one slot of PACKAGE_BITS per package not carried: cell, destination cell, on board. there
+#       are always 2 * package_count packages, so the slot count follows from how many are carried
+#   the spawn seed, num_steps and the 2 charge station cells
+LAYOUT = (5, 2, 2, 2)
+CELL_BITS = 5
+CELL_MASK = (1 << CELL_BITS) - 1
+WORD_BITS = 16
+WORD_MASK = (1 << WORD_BITS) - 1
+
+BATTERY_SHIFT = CELL_BITS
+CREDIT_SHIFT = BATTERY_SHIFT + WORD_BITS
+CARRY_SHIFT = CREDIT_SHIFT + WORD_BITS
+CARRIED_SHIFT = CARRY_SHIFT + 1
+ROBOT_BITS = CARRIED_SHIFT + 2 * CELL_BITS
+ROBOT_MASK = (1 << ROBOT_BITS) - 1
+
+PACKAGE_BITS = 2 * CELL_BITS + 1
+PACKAGE_MASK = (1 << PACKAGE_BITS) - 1
+ON_BOARD = 1 << 2 * CELL_BITS
+SLOTS = 4
+PACKAGES_SHIFT = 2 * ROBOT_BITS
+SEED_SHIFT = PACKAGES_SHIFT + SLOTS * PACKAGE_BITS
+STEPS_SHIFT = SEED_SHIFT + 8
+STATIONS_SHIFT = STEPS_SHIFT + WORD_BITS
+STATE_BITS = STATIONS_SHIFT + 2 * CELL_BITS
+STATE_BYTES = (STATE_BITS + 7) // 8
+KEY_MASK = (1 << 64) - 1
+
+_board = get_board(LAYOUT[0])
+# cell -> operator code -> the cell a move leads to
+_targets = [dict(moves) for moves in _board.moves]
+
+
+def layout(env: WarehouseEnv):
+    return env.board.size, len(env.robots), env.package_count, len(env.charge_stations)
+
+
+# whether env is a game on the default layout whose counters fit their fields
+def packable(env: WarehouseEnv):
+    return layout(env) == LAYOUT and 0 <= env.num_steps <= WORD_MASK and \
+        all(0 <= robot.battery <= WORD_MASK and 0 <= robot.credit <= WORD_MASK for robot in env.robots)
+
+
+def pack_state(env: WarehouseEnv):
+    assert packable(env), 'only games on the default layout are packed'
+    state = 0
+    for i, robot in enumerate(env.robots):
+        fields = robot.cell | robot.battery << BATTERY_SHIFT | robot.credit << CREDIT_SHIFT
+        if robot.package is not None:
+            fields |= 1 << CARRY_SHIFT | (robot.package.cell | robot.package.destination_cell << CELL_BITS) \
+                << CARRIED_SHIFT
+        state |= fields << i * ROBOT_BITS
+    for i, package in enumerate(env.packages):
+        fields = package.cell | package.destination_cell << CELL_BITS | (ON_BOARD if package.on_board else 0)
+        state |= fields << PACKAGES_SHIFT + i * PACKAGE_BITS
+    state |= env.seed << SEED_SHIFT | env.num_steps << STEPS_SHIFT
+    for i, charge_station in enumerate(env.charge_stations):
+        state |= env.board.cell_of[charge_station.position] << STATIONS_SHIFT + i * CELL_BITS
+    return state
+
+
+def unpack_state(state):
+    env = WarehouseEnv(LAYOUT[0])
+    positions = env.board.positions
+    env.num_steps = state >> STEPS_SHIFT & WORD_MASK
+    env.seed = state >> SEED_SHIFT & 0xFF
+    env.package_count = LAYOUT[2]
+    env.robots = []
+    for i in range(LAYOUT[1]):
+        fields = state >> i * ROBOT_BITS
+        robot = env.new_robot(positions[fields & CELL_MASK], fields >> BATTERY_SHIFT & WORD_MASK,
+                              fields >> CREDIT_SHIFT & WORD_MASK)
+        if fields >> CARRY_SHIFT & 1:
+            # only packages on the board are picked up
+            robot.package = unpack_package(env, fields >> CARRIED_SHIFT | ON_BOARD)
+        env.robots.append(robot)
+    env.packages = [unpack_package(env, state >> PACKAGES_SHIFT + i * PACKAGE_BITS)
+                    for i in range(slot_count(state))]
+    env.charge_stations = [ChargeStation(positions[state >> STATIONS_SHIFT + i * CELL_BITS & CELL_MASK])
+                           for i in range(LAYOUT[3])]
+    env.index_stations()
+    env.index_robots()
+    env.index_packages()
+    env.zobrist = env.full_zobrist()
+    return env
+
+
+def unpack_package(env: WarehouseEnv, fields):
+    package = env.new_package(env.board.positions[fields & CELL_MASK],
+                              env.board.positions[fields >> CELL_BITS & CELL_MASK])
+    package.on_board = bool(fields & ON_BOARD)
+    return package
+
+
+def to_bytes(state):
+    return state.to_bytes(STATE_BYTES, 'little')
+
+
+def from_bytes(data):
+    return int.from_bytes(data, 'little')
+
+
+# the state above a 64 bit hash of it: an exact key, whose low bits, which index a TranspositionTable, depend on
+# every field. the hash folds the state to 64 bits and mixes them like splitmix64's finalizer
+def state_key(state):
+    h = (state ^ state >> 64 ^ state >> 128) & KEY_MASK
+    h = (h ^ h >> 30) * 0xBF58476D1CE4E5B9 & KEY_MASK
+    h = (h ^ h >> 27) * 0x94D049BB133111EB & KEY_MASK
+    return state << 64 | h ^ h >> 31
+
+
+def slot_count(state):
+    return SLOTS - (state >> CARRY_SHIFT & 1) - (state >> ROBOT_BITS + CARRY_SHIFT & 1)
+
+
+def num_steps(state):
+    return state >> STEPS_SHIFT & WORD_MASK
+
+
+def robot_cell(state, robot_index):
+    return state >> robot_index * ROBOT_BITS & CELL_MASK
+
+
+def credit(state, robot_index):
+    return state >> robot_index * ROBOT_BITS + CREDIT_SHIFT & WORD_MASK
+
+
+def done(state):
+    return state >> STEPS_SHIFT & WORD_MASK == 0 or \
+        (state >> BATTERY_SHIFT & WORD_MASK == 0 and state >> ROBOT_BITS + BATTERY_SHIFT & WORD_MASK == 0)
+
+
+# the slot of the package get_package_in would find at cell, the first of packages[0:package_count] there, or None
+def package_slot(state, cell):
+    for i in range(min(LAYOUT[2], slot_count(state))):
+        if state >> PACKAGES_SHIFT + i * PACKAGE_BITS & CELL_MASK == cell:
+            return i
+    return None
+
+
+# WarehouseEnv.get_legal_codes on the packed state
+def legal_codes(state, robot_index):
+    fields = state >> robot_index * ROBOT_BITS & ROBOT_MASK
+    cell = fields & CELL_MASK
+    codes = []
+    if fields >> BATTERY_SHIFT & WORD_MASK:
+        other = state >> (1 - robot_index) * ROBOT_BITS & CELL_MASK
+        for code, new_cell in _board.moves[cell]:
+            if new_cell != other:
+                codes.append(code)
+        if not codes:
+            codes.append(PARK)
+    else:
+        codes.append(PARK)
+    stations = state >> STATIONS_SHIFT
+    if (stations & CELL_MASK == cell or stations >> CELL_BITS & CELL_MASK == cell) \
+            and fields >> CREDIT_SHIFT & WORD_MASK:
+        codes.append(CHARGE)
+    if fields >> CARRY_SHIFT & 1:
+        if fields >> CARRIED_SHIFT + CELL_BITS & CELL_MASK == cell:
+            codes.append(DROP_OFF)
+    else:
+        i = package_slot(state, cell)
+        if i is not None and state >> PACKAGES_SHIFT + i * PACKAGE_BITS & ON_BOARD:
+            codes.append(PICK_UP)
+    return codes
+
+
+# WarehouseEnv.apply_code on the packed state, returning the new state: code must be one of
+# legal_codes(state, robot_index)
+def apply_code(state, robot_index, code):
+    state -= 1 << STEPS_SHIFT
+    shift = robot_index * ROBOT_BITS
+    fields = state >> shift & ROBOT_MASK
+    cell = fields & CELL_MASK
+    if code < PARK:
+        fields += _targets[cell][code] - cell - (1 << BATTERY_SHIFT)
+    elif code == CHARGE:
+        battery = (fields >> BATTERY_SHIFT & WORD_MASK) + (fields >> CREDIT_SHIFT & WORD_MASK)
+        fields = cell | battery << BATTERY_SHIFT | fields & ~((1 << CARRY_SHIFT) - 1)
+    elif code == PICK_UP:
+        i = package_slot(state, cell)
+        packages = state >> PACKAGES_SHIFT & (1 << SLOTS * PACKAGE_BITS) - 1
+        package = packages >> i * PACKAGE_BITS & PACKAGE_MASK
+        fields |= 1 << CARRY_SHIFT | (package & ~ON_BOARD) << CARRIED_SHIFT
+        packages = packages & (1 << i * PACKAGE_BITS) - 1 | packages >> (i + 1) * PACKAGE_BITS << i * PACKAGE_BITS
+        state = state & ~((1 << SLOTS * PACKAGE_BITS) - 1 << PACKAGES_SHIFT) | packages << PACKAGES_SHIFT
+    elif code == DROP_OFF:
+        carried = fields >> CARRIED_SHIFT
+        fields += 2 * _board.distance[carried & CELL_MASK][carried >> CELL_BITS & CELL_MASK] << CREDIT_SHIFT
+        fields &= (1 << CARRY_SHIFT) - 1
+        # spawn_package appends the next package of the seed's schedule, then the first of packages[0:package_count]
+        # off the board goes on it
+        seed, spawn_cell, destination_cell = _board.spawns[state >> SEED_SHIFT & 0xFF]
+        slots = slot_count(state)
+        state = state & ~(0xFF << SEED_SHIFT) | seed << SEED_SHIFT \
+            | (spawn_cell | destination_cell << CELL_BITS) << PACKAGES_SHIFT + slots * PACKAGE_BITS
+        for i in range(LAYOUT[2]):
+            if not state >> PACKAGES_SHIFT + i * PACKAGE_BITS & ON_BOARD:
+                state |= ON_BOARD << PACKAGES_SHIFT + i * PACKAGE_BITS
+                break
+    return state & ~(ROBOT_MASK << shift) | fields << shift
+
+
+# submission.smart_heuristic on the packed state
+def smart_heuristic(state, taxi_id):
+    fields = state >> taxi_id * ROBOT_BITS
+    cell = fields & CELL_MASK
+    value = (fields >> CREDIT_SHIFT & WORD_MASK) * 1000
+    if fields >> CARRY_SHIFT & 1:
+        carried = fields >> CARRIED_SHIFT
+        destination = carried >> CELL_BITS & CELL_MASK
+        distance = _board.distance
+        return value + distance[carried & CELL_MASK][destination] - distance[cell][destination] + 100
+    cells = []
+    for i in range(min(LAYOUT[2], slot_count(state))):
+        package = state >> PACKAGES_SHIFT + i * PACKAGE_BITS
+        if package & ON_BOARD:
+            cells.append(package & CELL_MASK)
+    return value - _board.nearest_distance(tuple(cells))[cell]
+
+
+# a packed state with the WarehouseEnv methods a search walks positions with. the undo record of a step is the
+# state before it. zobrist is state_key, so transposition table keys are made the same way as for a WarehouseEnv,
+# worked out only for the nodes that look them up
+class PackedEnv(object):
+    def __init__(self, state):
+        self.state = state
+
+    @property
+    def zobrist(self):
+        return state_key(self.state)
+
+    @property
+    def num_steps(self):
+        return num_steps(self.state)
+
+    def get_legal_codes(self, robot_index: int):
+        return legal_codes(self.state, robot_index)
+
+    def get_legal_operators(self, robot_index: int):
+        return [OPERATORS[code] for code in legal_codes(self.state, robot_index)]
+
+    def apply_code(self, robot_index: int, code: int):
+        record = self.state
+        self.state = apply_code(record, robot_index, code)
+        return record
+
+    def undo_operator(self, record):
+        self.state = record
+
+    def done(self):
+        return done(self.state)
+
+    def robot_cell(self, robot_index):
+        return robot_cell(self.state, robot_index)
+
+    def unpack(self):
+        return unpack_state(self.state)
@@ -0,0 +1,132 @@
+import multiprocessing
+import time
+from multiprocessing.connection import wait
+
+
+# runs in each worker process: iterative deepening over its share of the root operators, reporting every
+# completed depth back to the pool. between turns it may ponder until the next message arrives
+def _search_worker(agent, connection):
+    agent.workers = 1
+    agent.pondering = False
+    while True:
+        message = connection.recv()
+        if message is None:
+            return
+        if message == 'stop':
+            continue
+        if message[0] == 'ponder':
+            agent.ponder(message[1], message[2], connection.poll)
+            continue
+        turn, env, agent_id, operators, start_time, time_limit = message
+        agent.begin_turn(env, start_time, time_limit)
+        agent.deepen(env, agent_id, operators,
+                     lambda depth, scores: connection.send((turn, depth, scores)))
+        connection.send((turn, None, None))
+
+
+# root-parallel search: the legal root operators are dealt round robin to persistent worker processes, each
+# keeping its own transposition table across turns, and the deepest depth every worker finished is used. a worker
+# that dies is dropped from the pool and the others search its share from the next turn on
+class SearchPool(object):
+    def __init__(self, agent, workers):
+        self.agent = agent
+        self.turn = 0
+        # deepest depth every worker completed in the last turn
+        self.completed_depth = None
+        self.connections = []
+        self.processes = []
+        for _ in range(workers):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_search_worker, args=(agent, worker_connection), daemon=True)
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def run_step(self, env, agent_id, start_time, time_limit):
+        self.turn += 1
+        operators = env.get_legal_operators(agent_id)
+        # depth -> {operator: value} for every busy worker
+        results = {}
+        # the share of a worker found dead here is dealt to the workers after it
+        undealt = operators
+        idle = list(self.connections)
+        while undealt and idle:
+            step = len(idle)
+            connection = idle.pop(0)
+            share = undealt[::step]
+            if self.send(connection, (self.turn, env, agent_id, share, start_time, time_limit)):
+                undealt = [op for i, op in enumerate(undealt) if i % step]
+                results[connection] = {}
+
+        pending = set(results)
+        deadline = start_time + time_limit - self.agent.time_margin
+        while pending:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            for connection in wait(list(pending), timeout):
+                try:
+                    turn, depth, scores = connection.recv()
+                except (EOFError, OSError):
+                    # a dead worker never completes a depth, so only depths finished before it died are used
+                    pending.discard(connection)
+                    self.drop(connection)
+                    continue
+                # late reports of a turn that already returned
+                if turn != self.turn:
+                    continue
+                if depth is None:
+                    pending.discard(connection)
+                else:
+                    results[connection][depth] = scores
+
+        scores = None
+        depth = 0
+        while results and all(depth in completed for completed in results.values()):
+            scores = {}
+            for completed in results.values():
+                scores.update(completed[depth])
+            depth += 1
+        self.completed_depth = depth - 1 if scores is not None else None
+        # no worker finished even depth 0 in time or none is left, the first legal operator is still a legal answer
+        if scores is None:
+            return operators[0]
+        return self.agent.select_operator(operators, scores)
+
+    # the workers search the replies to operator until stop() or the next turn, keeping what they find in their
+    # transposition tables
+    def ponder(self, env, agent_id, operator):
+        env = env.clone()
+        env.apply_operator(agent_id, operator)
+        if env.done():
+            return
+        for connection in list(self.connections):
+            self.send(connection, ('ponder', env, agent_id))
+
+    def stop(self):
+        for connection in list(self.connections):
+            self.send(connection, 'stop')
+
+    # sends message to a worker, dropping it from the pool if it has died. returns whether it was sent
+    def send(self, connection, message):
+        try:
+            connection.send(message)
+        except OSError:
+            self.drop(connection)
+            return False
+        return True
+
+    def drop(self, connection):
+        if connection in self.connections:
+            i = self.connections.index(connection)
+            del self.connections[i]
+            self.processes.pop(i).join(0)
+            connection.close()
+
+    def close(self):
+        for connection in list(self.connections):
+            self.send(connection, None)
+        for process in self.processes:
+            process.join(1)
+        self.connections = []
+        self.processes = []
@@ -0,0 +1,83 @@
+import json
+import time
+
+
+# wraps a bound method so that its calls and the time spent in them are added to the counters under name
+def _timed(method, seconds, calls, name):
+    def timed(*args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            seconds[name] += time.perf_counter() - start
+            calls[name] += 1
+    return timed
+
+
+# one RBAgent turn with its search instrumented, the callback gets a dict describing the turn.
+# the wrappers live on the agent and on the searched copy of env only for this turn, so agents
+# without a callback run the plain search
+def instrumented_run_step(agent, env, agent_id, callback):
+    seconds = {'clone': 0.0, 'legal_moves': 0.0, 'apply': 0.0, 'undo': 0.0, 'evaluation': 0.0}
+    calls = dict.fromkeys(seconds, 0)
+    start = time.perf_counter()
+    search_env = env.clone()
+    seconds['clone'] += time.perf_counter() - start
+    calls['clone'] += 1
+
+    search_env.get_legal_codes = _timed(search_env.get_legal_codes, seconds, calls, 'legal_moves')
+    search_env.apply_code = _timed(search_env.apply_code, seconds, calls, 'apply')
+    search_env.undo_operator = _timed(search_env.undo_operator, seconds, calls, 'undo')
+    agent.heuristic = _timed(agent.heuristic, seconds, calls, 'evaluation')
+
+    depths = []
+    last = {'nodes': agent.nodes, 'cutoffs': agent.cutoffs}
+
+    def completed(depth, scores):
+        depths.append({'depth': depth, 'nodes': agent.nodes - last['nodes'],
+                       'cutoffs': agent.cutoffs - last['cutoffs'], 'seconds': time.perf_counter() - start})
+        last['nodes'], last['cutoffs'] = agent.nodes, agent.cutoffs
+
+    try:
+        operator = agent.deepen(search_env, agent_id, completed=completed)
+    finally:
+        del agent.heuristic
+    total = time.perf_counter() - start
+
+    callback({
+        'agent': type(agent).__name__,
+        'robot': agent_id,
+        'num_steps': env.num_steps,
+        'time_limit': agent.time_limit,
+        'operator': operator,
+        'completed_depth': depths[-1]['depth'] if depths else None,
+        # None when the search stopped by itself, at the end of the game or before a depth it could not finish
+        'aborted_depth': agent.aborted_depth,
+        'partial_result': agent.partial_result,
+        'depths': depths,
+        'aborted_nodes': agent.nodes - last['nodes'],
+        'aborted_cutoffs': agent.cutoffs - last['cutoffs'],
+        'nodes': agent.nodes,
+        'cutoffs': agent.cutoffs,
+        'heuristic_calls': calls['evaluation'],
+        'calls': calls,
+        'seconds': dict(seconds, total=total),
+        # time spent on the iteration that timed out, whose result is thrown away
+        'wasted_seconds': total - (depths[-1]['seconds'] if depths else 0.0)
+        if agent.aborted_depth is not None and not agent.partial_result else 0.0,
+    })
+    return operator
+
+
+# appends one JSON object per turn to a file, with fixed fields such as the game seed added to every record
+class JsonlSink(object):
+    def __init__(self, path, **fields):
+        self.file = open(path, 'a')
+        self.fields = fields
+
+    def __call__(self, record):
+        self.file.write(json.dumps(dict(self.fields, **record)) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,102 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+SLOT = struct.Struct('<Q')
+
+
+# a file of a header and open addressing slots, each holding (key >> VALUE_BITS << VALUE_BITS) | value, with 0 for
+# an empty slot. the file is memory mapped on the first lookup, a missing file is an empty table. subclasses name
+# the file format and take their fields from the header, which starts with the magic, version, slot count and entry
+# count
+class SlotTable(object):
+    MAGIC = None
+    VERSION = None
+    HEADER = None
+    VALUE_BITS = 0
+    # what the file is, for the error when it is something else
+    KIND = 'slot table'
+
+    def __init__(self, path):
+        self.path = path
+        self.loaded = False
+        self.data = None
+        self.mask = 0
+        self.entries = 0
+
+    # worker processes map the file again themselves
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def load(self):
+        self.loaded = True
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, slots, self.entries, *fields = self.HEADER.unpack_from(self.data)
+        assert magic == self.MAGIC and version == self.VERSION, self.path + ' is not ' + self.KIND
+        self.mask = slots - 1
+        self.read_header(*fields)
+
+    # the header fields after the entry count
+    def read_header(self, *fields):
+        pass
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+        self.__init__(self.path)
+
+    # the value stored for key, or None if the table does not hold it
+    def lookup(self, key):
+        if not self.loaded:
+            self.load()
+        if self.data is None:
+            return None
+        key >>= self.VALUE_BITS
+        index = key & self.mask
+        while True:
+            entry = SLOT.unpack_from(self.data, self.HEADER.size + index * SLOT.size)[0]
+            if entry == 0:
+                return None
+            if entry >> self.VALUE_BITS == key:
+                return entry & ((1 << self.VALUE_BITS) - 1)
+            index = (index + 1) & self.mask
+
+    # key -> value of every entry, the keys without their low VALUE_BITS bits
+    def items(self):
+        if not self.loaded:
+            self.load()
+        if self.data is None:
+            return {}
+        table = array('Q', self.data[self.HEADER.size:])
+        if sys.byteorder != 'little':
+            table.byteswap()
+        bits = self.VALUE_BITS
+        return {entry >> bits << bits: entry & ((1 << bits) - 1) for entry in table if entry}
+
+    # writes entries, key -> value, as a file of this class's format, with the given header fields after the entry
+    # count
+    @classmethod
+    def write(cls, path, entries, *fields):
+        bits = cls.VALUE_BITS
+        slots = 1
+        while slots < 2 * len(entries):
+            slots *= 2
+        table = array('Q', bytes(8 * slots))
+        for key, value in entries.items():
+            index = (key >> bits) & (slots - 1)
+            while table[index]:
+                index = (index + 1) & (slots - 1)
+            table[index] = (key >> bits << bits) | value
+        if sys.byteorder != 'little':
+            table.byteswap()
+        with open(path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, slots, len(entries), *fields))
+            table.tofile(f)
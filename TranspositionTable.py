@@ -0,0 +1,34 @@
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+# bounded table of search results keyed by zobrist hash, one entry per slot
+class TranspositionTable(object):
+    def __init__(self, size=1 << 18):
+        assert size & (size - 1) == 0, 'size must be a power of two'
+        self.mask = size - 1
+        self.slots = [None] * size
+        self.generation = 0
+
+    def clear(self):
+        self.slots = [None] * len(self.slots)
+        self.generation = 0
+
+    # entries stored before this call are kept for lookups but become the first to be replaced
+    def new_search(self):
+        self.generation += 1
+
+    # returns (key, depth, value, bound, move, generation) or None
+    def probe(self, key):
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    # replace-by-depth, except that entries of older searches are always replaced
+    def store(self, key, depth, value, bound, move):
+        index = key & self.mask
+        entry = self.slots[index]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self.slots[index] = (key, depth, value, bound, move, self.generation)
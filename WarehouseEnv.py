@@ -1,15 +1,95 @@
+import hashlib
 import random
 from copy import copy
-import pygame
 
 board_size = 5
-import time
 
 
 def manhattan_distance(p0, p1):
     return abs(p0[0] - p1[0]) + abs(p0[1] - p1[1])
 
 
+MOVES = [('move north', (0, -1)), ('move south', (0, 1)), ('move west', (-1, 0)), ('move east', (1, 0))]
+
+# integer operator codes, the search works with these and main.py with the names. the moves come first, in
+# MOVES order
+OPERATORS = ['move north', 'move south', 'move west', 'move east', 'park', 'charge', 'pick up', 'drop off']
+MOVE_NORTH, MOVE_SOUTH, MOVE_WEST, MOVE_EAST, PARK, CHARGE, PICK_UP, DROP_OFF = range(len(OPERATORS))
+OPERATOR_CODES = {operator: code for code, operator in enumerate(OPERATORS)}
+
+
+def operator_code(operator: str):
+    return OPERATOR_CODES[operator]
+
+
+def operator_name(code: int):
+    return OPERATORS[code]
+
+
+# per board size lookup tables, cells are numbered row by row: cell = y * size + x
+class Board(object):
+    def __init__(self, size):
+        self.size = size
+        self.positions = [(x, y) for y in range(size) for x in range(size)]
+        self.cell_of = {p: cell for cell, p in enumerate(self.positions)}
+        # cell -> [(operator code, neighbor cell)] for the in-bounds moves, in get_legal_codes order
+        self.moves = [[(code, self.cell_of[(p[0] + d[0], p[1] + d[1])]) for code, (_, d) in enumerate(MOVES)
+                       if (p[0] + d[0], p[1] + d[1]) in self.cell_of] for p in self.positions]
+        self.distance = [[abs(x1 - x0) + abs(y1 - y0) for x1, y1 in self.positions] for x0, y0 in self.positions]
+        # tuple of cells -> every cell's distance to the nearest of them, for the package layouts seen lately. the
+        # rows are bounded to about 2**18 cells, 2 MB of list slots, so a 50x50 board keeps about a hundred of them
+        self.nearest = {}
+        self.nearest_limit = max(64, (1 << 18) // len(self.positions))
+        # seed -> (next seed, package cell, destination cell) of the package spawn_package draws from it. the
+        # seed chain is the same whatever the robots do, so a game's spawns are looked up rather than drawn
+        self.spawns = tuple(self.spawn(seed) for seed in range(256))
+
+    # the cells random_cells(2) draws from seed, with a private generator so the global random is left alone
+    def spawn(self, seed):
+        rng = random.Random(seed)
+        next_seed = rng.randint(0, 255)
+        position, destination = rng.sample([(x, y) for x in range(self.size) for y in range(self.size)], 2)
+        return next_seed, self.cell_of[position], self.cell_of[destination]
+
+    # a search keeps returning to the same few package layouts, so their rows are kept rather than rebuilt. with
+    # no cells there is nothing to walk to and every distance is 0
+    def nearest_distance(self, cells):
+        row = self.nearest.get(cells)
+        if row is None:
+            if len(self.nearest) >= self.nearest_limit:
+                self.nearest.clear()
+            if len(cells) > 1:
+                row = list(map(min, *(self.distance[c] for c in cells)))
+            else:
+                row = self.distance[cells[0]] if cells else [0] * len(self.positions)
+            self.nearest[cells] = row
+        return row
+
+
+_boards = {}
+
+
+def get_board(size):
+    board = _boards.get(size)
+    if board is None:
+        board = _boards[size] = Board(size)
+    return board
+
+
+# 64 bit keys for the zobrist hash, made lazily since battery, credit and num_steps are unbounded. each key is
+# derived from its component, so a hash names the same state in every process and run (EndgameTablebase files
+# are keyed by it)
+_zobrist_keys = {}
+
+
+def zobrist_key(*component):
+    key = _zobrist_keys.get(component)
+    if key is None:
+        digest = hashlib.blake2b(repr(component).encode(), digest_size=8).digest()
+        key = _zobrist_keys[component] = int.from_bytes(digest, 'little')
+    return key
+
+
 class Robot(object):
     def __init__(self, position, battery, credit):
         self.position = position
@@ -41,129 +121,295 @@ class ChargeStation(object):
 
 
 class WarehouseEnv(object):
-    def __init__(self):
+    def __init__(self, size=board_size):
         self.charge_stations = None
         self.packages = None
         self.robots = None
         self.seed = None
         self.num_steps = None
-
-        # for animation purposes
-        self.window = None
-        self.clock = None
-
-    def generate(self, seed, num_steps):
+        self.zobrist = None
+        self.board = get_board(size)
+        # packages[0:package_count] are on the board or about to be, the packages behind them are queued
+        self.package_count = 2
+        # cell -> the robot / charge station / package in packages[0:package_count] standing there, or None
+        self.robot_at = None
+        self.station_at = None
+        self.package_at = None
+        # the cells of packages[0:package_count] in package_at
+        self.package_cells = ()
+        # cell -> its distance to the nearest package on the board, 0 when all of them are carried
+        self.package_distance = None
+
+    # the robots move in index order, num_steps counts the moves of all of them
+    def generate(self, seed, num_steps, robot_count=2, package_count=2, station_count=2):
         self.num_steps = num_steps
         self.seed = seed
-        self.robots = [Robot(p, 20, 0) for p in self.random_cells(2)]
-        self.packages = [Package(p, d) for _ in range(4) for p in self.random_cells(1) for d in
-                         self.random_cells(1)]
-        for i in range(2):
+        self.package_count = package_count
+        self.robots = [self.new_robot(p, 20, 0) for p in self.random_cells(robot_count)]
+        self.packages = [self.new_package(p, d) for _ in range(2 * package_count) for p in self.random_cells(1)
+                         for d in self.random_cells(1)]
+        for i in range(package_count):
             self.packages[i].on_board = True
 
-        self.charge_stations = [ChargeStation(p) for p in self.random_cells(2)]
+        self.charge_stations = [ChargeStation(p) for p in self.random_cells(station_count)]
+        self.index_stations()
+        self.index_robots()
+        self.index_packages()
+        self.zobrist = self.full_zobrist()
 
+    # charge stations never change, so clones share them and their index
     def clone(self):
-        cloned = WarehouseEnv()
+        cloned = WarehouseEnv(self.board.size)
         cloned.num_steps = self.num_steps
         cloned.seed = self.seed
+        cloned.zobrist = self.zobrist
+        cloned.package_count = self.package_count
         cloned.robots = [copy(t) for t in self.robots]
         cloned.packages = [copy(p) for p in self.packages]
-        cloned.charge_stations = [copy(g) for g in self.charge_stations]
+        cloned.charge_stations = self.charge_stations
+        cloned.station_at = self.station_at
+        cloned.index_robots()
+        cloned.index_packages()
         return cloned
 
+    # the board tables and cell indices are rebuilt on unpickling rather than sent along
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['board'] = self.board.size
+        for index in ('robot_at', 'station_at', 'package_at', 'package_cells', 'package_distance'):
+            del state[index]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.board = get_board(state['board'])
+        self.package_at = None
+        self.package_cells = ()
+        self.index_stations()
+        self.index_robots()
+        self.index_packages()
+
+    def new_robot(self, position, battery, credit):
+        robot = Robot(position, battery, credit)
+        robot.cell = self.board.cell_of[position]
+        return robot
+
+    def new_package(self, position, destination):
+        package = Package(position, destination)
+        package.cell = self.board.cell_of[position]
+        package.destination_cell = self.board.cell_of[destination]
+        return package
+
+    def index_stations(self):
+        self.station_at = [None] * len(self.board.positions)
+        for charge_station in reversed(self.charge_stations):
+            self.station_at[self.board.cell_of[charge_station.position]] = charge_station
+
+    def index_robots(self):
+        self.robot_at = [None] * len(self.board.positions)
+        for robot in reversed(self.robots):
+            self.robot_at[robot.cell] = robot
+
+    # only packages[0:package_count] are on the board, get_package_in prefers the first of them sharing a cell.
+    # just the cells they leave and enter are updated, the board can be large
+    def index_packages(self):
+        package_at = self.package_at
+        if package_at is None:
+            package_at = self.package_at = [None] * len(self.board.positions)
+        for cell in self.package_cells:
+            package_at[cell] = None
+        slots = self.packages[0:self.package_count]
+        for package in reversed(slots):
+            package_at[package.cell] = package
+        self.package_cells = tuple(package.cell for package in slots)
+        # kept with the packages on pick up and drop off, so that target_distance is a lookup. distances are
+        # symmetric, so this is the distance from every cell to the nearest package
+        cells = tuple(package.cell for package in slots if package.on_board)
+        self.package_distance = self.board.nearest_distance(cells)
+
+    # the distance from the robot to its package's destination, or to the nearest package on the board if it
+    # carries none
+    def target_distance(self, robot):
+        if robot.package is not None:
+            return self.board.distance[robot.cell][robot.package.destination_cell]
+        return self.package_distance[robot.cell]
+
+    # hash of the whole state, apply_operator and undo_operator keep self.zobrist equal to it incrementally
+    def full_zobrist(self):
+        h = zobrist_key('steps', self.num_steps) ^ self.packages_zobrist()
+        for i, robot in enumerate(self.robots):
+            h ^= zobrist_key('position', i, robot.position) ^ zobrist_key('battery', i, robot.battery) \
+                ^ zobrist_key('credit', i, robot.credit)
+            if robot.package is not None:
+                h ^= zobrist_key('carry', i, robot.package.position, robot.package.destination)
+        for charge_station in self.charge_stations:
+            h ^= zobrist_key('station', charge_station.position)
+        return h
+
+    # the package list changes only on pick up and drop off, so it is rehashed as a whole
+    def packages_zobrist(self):
+        h = zobrist_key('seed', self.seed)
+        for i, package in enumerate(self.packages):
+            h ^= zobrist_key('package', i, package.position, package.destination, package.on_board)
+        return h
+
     def random_cells(self, count: int):
-        random.seed(self.seed)
-        self.seed = random.randint(0, 255)
-        return random.sample([(x, y) for x in range(board_size) for y in range(board_size)], count)
+        rng = random.Random(self.seed)
+        self.seed = rng.randint(0, 255)
+        return rng.sample([(x, y) for x in range(self.board.size) for y in range(self.board.size)], count)
 
     def get_robot(self, robot_id):
         return self.robots[robot_id]
 
+    def robot_cell(self, robot_index):
+        return self.robots[robot_index].cell
+
     def get_robot_in(self, position):
-        robots = [robot for robot in self.robots if robot.position == position]
-        if len(robots) == 0:
+        cell = self.board.cell_of.get(position)
+        if cell is None:
             return None
-        else:
-            return robots[0]
+        return self.robot_at[cell]
 
     def get_charge_station_in(self, position):
-        charge_stations = [charge_station for charge_station in self.charge_stations if
-                           charge_station.position == position]
-        if len(charge_stations) == 0:
+        cell = self.board.cell_of.get(position)
+        if cell is None:
             return None
-        return charge_stations[0]
+        return self.station_at[cell]
 
     def get_package_in(self, position):
-        packages = [package for package in self.packages[0:2] if package.position == position]
-        if len(packages) == 0:
+        cell = self.board.cell_of.get(position)
+        if cell is None:
             return None
-        return packages[0]
+        return self.package_at[cell]
 
     def get_legal_operators(self, robot_index: int):
-        ops = []
+        return [OPERATORS[code] for code in self.get_legal_codes(robot_index)]
+
+    def get_legal_codes(self, robot_index: int):
+        codes = []
         robot = self.robots[robot_index]
-        robot_pos = robot.position
+        cell = robot.cell
         if robot.battery > 0:
-            for op_move, op_disp in [('move north', (0, -1)), ('move south', (0, 1)),
-                                     ('move west', (-1, 0)), ('move east', (1, 0))]:
-                new_pos = (robot_pos[0] + op_disp[0], robot_pos[1] + op_disp[1])
-                if board_size > new_pos[0] >= 0 and board_size > new_pos[1] >= 0 \
-                        and self.get_robot_in(new_pos) is None:
-                    ops.append(op_move)
+            robot_at = self.robot_at
+            for code, new_cell in self.board.moves[cell]:
+                if robot_at[new_cell] is None:
+                    codes.append(code)
+            # boxed in by other robots, which takes more than two of them
+            if not codes:
+                codes.append(PARK)
         else:
-            ops.append('park')
-        if self.get_charge_station_in(robot_pos) and robot.credit > 0:
-            ops.append("charge")
-        if robot.package is not None and robot.package.destination == robot_pos:
-            ops.append("drop off")
-        package = self.get_package_in(robot.position)
+            codes.append(PARK)
+        if self.station_at[cell] is not None and robot.credit > 0:
+            codes.append(CHARGE)
+        if robot.package is not None and robot.package.destination_cell == cell:
+            codes.append(DROP_OFF)
+        package = self.package_at[cell]
         if robot.package is None and package is not None and package.on_board:
-            ops.append("pick up")
-        return ops
+            codes.append(PICK_UP)
+        return codes
 
     def move_robot(self, robot_index: int, offset):
-        p = self.robots[robot_index].position
-        self.robots[robot_index].position = p[0] + offset[0], p[1] + offset[1]
-        self.robots[robot_index].battery -= 1
-
+        robot = self.robots[robot_index]
+        p = robot.position
+        self.robot_at[robot.cell] = None
+        robot.cell += offset[0] + offset[1] * self.board.size
+        robot.position = self.board.positions[robot.cell]
+        self.robot_at[robot.cell] = robot
+        robot.battery -= 1
+        self.zobrist ^= zobrist_key('position', robot_index, p) ^ zobrist_key('position', robot_index, robot.position) \
+            ^ zobrist_key('battery', robot_index, robot.battery + 1) ^ zobrist_key('battery', robot_index, robot.battery)
+
+    # the same package random_cells(2) would draw, from the board's spawn schedule
     def spawn_package(self):
-        ps = self.random_cells(2)
-        return self.packages.append(Package(ps[0], ps[1]))
+        self.seed, cell, destination_cell = self.board.spawns[self.seed]
+        package = Package(self.board.positions[cell], self.board.positions[destination_cell])
+        package.cell = cell
+        package.destination_cell = destination_cell
+        self.packages.append(package)
 
+    # applies the operator and returns an undo record that undo_operator() uses to restore the prior state
     def apply_operator(self, robot_index: int, operator: str):
-        self.num_steps -= 1
-        robot = self.robots[robot_index]
         assert operator in self.get_legal_operators(robot_index)
-        assert not self.num_steps < 0
-        if operator == 'park':
-            pass
-        elif operator == 'move north':
-            self.move_robot(robot_index, (0, -1))
-        elif operator == 'move south':
-            self.move_robot(robot_index, (0, 1))
-        elif operator == 'move east':
-            self.move_robot(robot_index, (1, 0))
-        elif operator == 'move west':
-            self.move_robot(robot_index, (-1, 0))
-        elif operator == 'pick up':
-            package = self.get_package_in(robot.position)
-            self.robots[robot_index].package = package
-            self.packages.remove(package)
-        elif operator == 'charge':
-            robot.battery += robot.credit
-            robot.credit = 0
-        elif operator == 'drop off':
-            robot.credit += manhattan_distance(robot.package.position, robot.package.destination) * 2
-            self.spawn_package()
-            if not self.packages[0].on_board:
-                self.packages[0].on_board = True
-            else:
-                self.packages[1].on_board = True
+        assert self.num_steps > 0
+        return self.apply_code(robot_index, OPERATOR_CODES[operator])
 
-            robot.package = None
-        else:
-            assert False
+    # apply_operator without the checks, for the search: code must be one of get_legal_codes(robot_index)
+    def apply_code(self, robot_index: int, code: int):
+        self.num_steps -= 1
+        robot = self.robots[robot_index]
+        record = (robot_index, code, robot.position, robot.battery, robot.credit, robot.package, self.seed,
+                  self.zobrist)
+        self.zobrist ^= zobrist_key('steps', self.num_steps + 1) ^ zobrist_key('steps', self.num_steps)
+        return record + (self.operations[code](self, robot_index, robot, code),)
+
+    # the operations return the slot of the package picked up or put on the board for the undo record
+
+    def _move(self, robot_index, robot, code):
+        self.move_robot(robot_index, MOVES[code][1])
+
+    def _park(self, robot_index, robot, code):
+        pass
+
+    def _charge(self, robot_index, robot, code):
+        self.zobrist ^= zobrist_key('battery', robot_index, robot.battery) \
+            ^ zobrist_key('credit', robot_index, robot.credit) \
+            ^ zobrist_key('battery', robot_index, robot.battery + robot.credit) ^ zobrist_key('credit', robot_index, 0)
+        robot.battery += robot.credit
+        robot.credit = 0
+
+    def _pick_up(self, robot_index, robot, code):
+        package = self.package_at[robot.cell]
+        self.zobrist ^= self.packages_zobrist() ^ zobrist_key('carry', robot_index, package.position,
+                                                              package.destination)
+        robot.package = package
+        index = self.packages.index(package)
+        del self.packages[index]
+        self.index_packages()
+        self.zobrist ^= self.packages_zobrist()
+        return index
+
+    def _drop_off(self, robot_index, robot, code):
+        self.zobrist ^= self.packages_zobrist() ^ zobrist_key('credit', robot_index, robot.credit) \
+            ^ zobrist_key('carry', robot_index, robot.package.position, robot.package.destination)
+        robot.credit += self.board.distance[robot.package.cell][robot.package.destination_cell] * 2
+        self.spawn_package()
+        index = None
+        for i in range(self.package_count):
+            if not self.packages[i].on_board:
+                self.packages[i].on_board = True
+                index = i
+                break
+        self.index_packages()
+
+        robot.package = None
+        self.zobrist ^= self.packages_zobrist() ^ zobrist_key('credit', robot_index, robot.credit)
+        return index
+
+    # operator code -> its operation
+    operations = [_move, _move, _move, _move, _park, _charge, _pick_up, _drop_off]
+
+    def undo_operator(self, record):
+        robot_index, code, position, battery, credit, package, seed, zobrist, index = record
+        robot = self.robots[robot_index]
+        if code == PICK_UP:
+            self.packages.insert(index, robot.package)
+            self.index_packages()
+        elif code == DROP_OFF:
+            self.packages.pop()
+            if index is not None:
+                self.packages[index].on_board = False
+            self.index_packages()
+        elif robot.position != position:
+            self.robot_at[robot.cell] = None
+            robot.cell = self.board.cell_of[position]
+            self.robot_at[robot.cell] = robot
+        robot.position = position
+        robot.battery = battery
+        robot.credit = credit
+        robot.package = package
+        self.seed = seed
+        self.zobrist = zobrist
+        self.num_steps += 1
 
     def done(self):
         return len([robot for robot in self.robots if robot.battery > 0]) == 0 or self.num_steps <= 0
@@ -175,24 +421,24 @@ class WarehouseEnv(object):
         return self.robots[robot_index].package is not None
 
     def print(self):
-        for y in range(board_size):
-            for x in range(board_size):
+        for y in range(self.board.size):
+            for x in range(self.board.size):
                 p = (x, y)
                 robot = self.get_robot_in(p)
                 package = self.get_package_in(p)
                 charge_station = self.get_charge_station_in(p)
-                package_destination = [package for package in self.packages[0:2] if
+                package_destination = [package for package in self.packages[0:self.package_count] if
                                        package.destination == p and package.on_board]
                 robot_package_destination = [i for i, robot in enumerate(self.robots) if robot.package is not None
                                              and robot.package.destination == p]
                 if robot:
                     print('[R' + str(self.robots.index(robot)) + ']', end='')
                 elif package and package.on_board:
-                    print('[P' + str(self.packages[0:2].index(package)) + ']', end='')
+                    print('[P' + str(self.packages[0:self.package_count].index(package)) + ']', end='')
                 elif charge_station:
                     print('[C' + str(self.charge_stations.index(charge_station)) + ']', end='')
                 elif len(package_destination) > 0:
-                    print('[D' + str(self.packages[0:2].index(package_destination[0])) + ']', end='')
+                    print('[D' + str(self.packages[0:self.package_count].index(package_destination[0])) + ']', end='')
                 elif len(robot_package_destination) > 0:
                     print('[X' + str(robot_package_destination[0]) + ']', end='')
                 else:
@@ -205,148 +451,3 @@ class WarehouseEnv(object):
             print(package.position, package.destination, package.on_board)
 
         print('charge stations: ', self.charge_stations)
-
-    def _pygame_print_robot_data(self, robot, canvas, robot_index):
-
-        robot_pos = robot.position
-        robot_pos_txt = 'position: ' + str(robot_pos)
-        robot_battery = robot.battery
-        robot_battery_txt = 'battery: ' + str(robot_battery)
-        robot_credit = robot.credit
-        robot_credit_txt = 'credit: ' + str(robot_credit)
-        robot_package = robot.package
-
-        font = pygame.font.Font('freesansbold.ttf', 16)
-        black = (0, 0, 0)
-        red = (255, 0, 0)
-        blue = (0, 0, 255)
-
-        if robot_index == 0:
-            canvas.blit(pygame.transform.scale(self.blue_robot_icon, (95, 95)), (95, 80))
-            text = font.render(robot_pos_txt, True, black)
-            canvas.blit(text, (185, 95))
-            text = font.render(robot_battery_txt, True, black)
-            canvas.blit(text, (185, 115))
-            text = font.render(robot_credit_txt, True, black)
-            canvas.blit(text, (185, 135))
-            if robot_package is not None:
-                robot_package_txt = 'package: ' + str(robot_package.position) + ' -> ' + str(robot_package.destination)
-                text = font.render(robot_package_txt, True, black)
-                canvas.blit(text, (185, 155))
-        else:
-            canvas.blit(pygame.transform.scale(self.red_robot_icon, (86, 86)), (355, 80))
-            text = font.render(robot_pos_txt, True, black)
-            canvas.blit(text, (445, 95))
-            text = font.render(robot_battery_txt, True, black)
-            canvas.blit(text, (445, 115))
-            text = font.render(robot_credit_txt, True, black)
-            canvas.blit(text, (445, 135))
-            if robot_package is not None:
-                robot_package_txt = 'package: ' + str(robot_package.position) + ' -> ' + str(robot_package.destination)
-                text = font.render(robot_package_txt, True, black)
-                canvas.blit(text, (445, 155))
-
-    def pygame_print(self):
-        if self.window is None:
-            pygame.init()
-            self.window = pygame.display.set_mode((720, 720))
-            self.clock = pygame.time.Clock()
-            self.blue_robot_icon = pygame.image.load("icons/robot_b.jpeg").convert()
-            self.red_robot_icon = pygame.image.load("icons/robot_r.jpeg").convert()
-            self.blue_robot_package_icon = pygame.image.load("icons/robot_b_package.jpeg").convert()
-            self.red_robot_package_icon = pygame.image.load("icons/robot_r_package.jpeg").convert()
-            self.charge_stations_icon = pygame.image.load("icons/charge_station.jpeg").convert()
-            self.package_1_icon = pygame.image.load("icons/package_1.jpeg").convert()
-            self.package_2_icon = pygame.image.load("icons/package_2.jpeg").convert()
-            self.dest_1 = pygame.image.load("icons/dest_1.jpeg").convert()
-            self.dest_2 = pygame.image.load("icons/dest_2.jpeg").convert()
-            self.dest_red = pygame.image.load("icons/dest_red.jpeg").convert()
-            self.dest_blue = pygame.image.load("icons/dest_blue.jpeg").convert()
-
-        canvas = pygame.Surface((720, 720))
-        canvas.fill((255, 255, 255))
-
-        # print robot's data
-        for robot_index in range(len(self.robots)):
-            self._pygame_print_robot_data(self.robots[robot_index], canvas, robot_index)
-
-        # print title
-        font = pygame.font.Font('freesansbold.ttf', 28)
-        black = (0, 0, 0)
-        text = font.render('AI warehouse', True, black)
-        canvas.blit(text, (215, 20))
-
-        for x in range(6):
-            pygame.draw.line(
-                canvas,
-                0,
-                (110, x * 100 + 190),
-                (610, x * 100 + 190),
-                width=3,
-            )
-            pygame.draw.line(
-                canvas,
-                0,
-                (x * 100 + 110, 190),
-                (x * 100 + 110, 690),
-                width=3,
-            )
-
-        # print board elements
-        for y in range(board_size):
-            for x in range(board_size):
-                p = (x, y)
-                robot = self.get_robot_in(p)
-                package = self.get_package_in(p)
-                charge_station = self.get_charge_station_in(p)
-                package_destination = [package for package in self.packages if
-                                       package.destination == p and package.on_board]
-                robot_package_destination = [i for i, robot in enumerate(self.robots) if
-                                             robot.package is not None
-                                             and robot.package.destination == p]
-                if robot:
-                    if self.robots.index(robot) == 0:
-                        if robot.package is not None:
-                            canvas.blit(pygame.transform.scale(self.blue_robot_package_icon, (95, 95)),
-                                        (x * 100 + 112, y * 100 + 192))
-                        else:
-                            canvas.blit(pygame.transform.scale(self.blue_robot_icon, (95, 95)),
-                                        (x * 100 + 112, y * 100 + 192))
-                    else:
-                        if robot.package is not None:
-                            canvas.blit(pygame.transform.scale(self.red_robot_package_icon, (95, 95)),
-                                        (x * 100 + 112, y * 100 + 192))
-                        else:
-                            canvas.blit(pygame.transform.scale(self.red_robot_icon, (95, 95)),
-                                        (x * 100 + 112, y * 100 + 192))
-                elif charge_station:
-                    canvas.blit(pygame.transform.scale(self.charge_stations_icon, (80, 80)),
-                                (x * 100 + 120, y * 100 + 200))
-
-                elif package and package.on_board:
-                    if self.packages.index(package) == 0:
-                        canvas.blit(pygame.transform.scale(self.package_1_icon, (80, 80)),
-                                    (x * 100 + 120, y * 100 + 200))
-                    else:
-                        canvas.blit(pygame.transform.scale(self.package_2_icon, (80, 80)),
-                                    (x * 100 + 120, y * 100 + 200))
-
-                elif len(package_destination) > 0:
-                    if self.packages.index(package_destination[0]) == 0:
-                        canvas.blit(pygame.transform.scale(self.dest_1, (80, 80)),
-                                    (x * 100 + 120, y * 100 + 200))
-                    else:
-                        canvas.blit(pygame.transform.scale(self.dest_2, (80, 80)),
-                                    (x * 100 + 120, y * 100 + 200))
-                elif len(robot_package_destination) > 0:
-                    if robot_package_destination[0] == 0:
-                        canvas.blit(pygame.transform.scale(self.dest_blue, (80, 80)),
-                                    (x * 100 + 120, y * 100 + 200))
-                    else:
-                        canvas.blit(pygame.transform.scale(self.dest_red, (80, 80)),
-                                    (x * 100 + 120, y * 100 + 200))
-
-        self.window.blit(canvas, (0, 0))
-        pygame.display.update()
-        self.clock.tick(5)
-        time.sleep(0.1)
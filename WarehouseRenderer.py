@@ -0,0 +1,154 @@
+import os
+
+import pygame
+
+from WarehouseEnv import WarehouseEnv
+
+ICONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'icons')
+WIDTH = HEIGHT = 720
+# the board's top left corner and the width of a cell
+BOARD_LEFT, BOARD_TOP, CELL = 110, 190, 100
+# icon -> (file, size, offset in its cell)
+ICON_FILES = {
+    'robot_0': ('robot_b.jpeg', 95, 2),
+    'robot_1': ('robot_r.jpeg', 95, 2),
+    'robot_0_package': ('robot_b_package.jpeg', 95, 2),
+    'robot_1_package': ('robot_r_package.jpeg', 95, 2),
+    'charge_station': ('charge_station.jpeg', 80, 10),
+    'package_0': ('package_1.jpeg', 80, 10),
+    'package_1': ('package_2.jpeg', 80, 10),
+    'destination_0': ('dest_1.jpeg', 80, 10),
+    'destination_1': ('dest_2.jpeg', 80, 10),
+    'robot_0_destination': ('dest_blue.jpeg', 80, 10),
+    'robot_1_destination': ('dest_red.jpeg', 80, 10),
+}
+# robot index -> left edge of its panel's icon and text, and the icon's size. the panels overlap, so both are
+# drawn again when one changes
+PANELS = [(95, 185, 95), (355, 445, 86)]
+PANEL_AREA = pygame.Rect(0, 60, WIDTH, BOARD_TOP - 62)
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+
+
+# draws a WarehouseEnv in a pygame window, imported only when a game is shown on screen. the icons are scaled and
+# the fonts opened once, and a frame redraws only the cells and robot panels that changed since the last one.
+# fps caps the frames per second, None renders as fast as the game goes. headless draws off screen, and with
+# frame_dir every frame is saved there as a numbered PNG
+class WarehouseRenderer(object):
+    def __init__(self, fps=5, headless=False, frame_dir=None):
+        self.fps = fps
+        self.headless = headless
+        self.frame_dir = frame_dir
+        self.frame = 0
+        self.window = None
+        self.canvas = None
+        self.clock = None
+        self.icons = None
+        self.panel_icons = None
+        self.font = None
+        # cell -> the icon drawn there, and the lines of every robot's panel
+        self.cells = {}
+        self.panels = None
+
+    def start(self, env: WarehouseEnv):
+        # off screen only the fonts need initializing, there may be no display to open
+        if self.headless:
+            pygame.font.init()
+        else:
+            pygame.init()
+            self.window = pygame.display.set_mode((WIDTH, HEIGHT))
+        self.clock = pygame.time.Clock()
+        images = {}
+        for name, (file, size, offset) in ICON_FILES.items():
+            images[name] = pygame.image.load(os.path.join(ICONS, file))
+            if self.window is not None:
+                images[name] = images[name].convert()
+        self.icons = {name: pygame.transform.scale(images[name], (size, size))
+                      for name, (file, size, offset) in ICON_FILES.items()}
+        self.panel_icons = [pygame.transform.scale(images['robot_%d' % i], (size, size))
+                            for i, (_, _, size) in enumerate(PANELS)]
+        self.font = pygame.font.Font('freesansbold.ttf', 16)
+        self.canvas = pygame.Surface((WIDTH, HEIGHT))
+        self.canvas.fill(WHITE)
+        self.canvas.blit(pygame.font.Font('freesansbold.ttf', 28).render('AI warehouse', True, BLACK), (215, 20))
+        end = BOARD_LEFT + env.board.size * CELL, BOARD_TOP + env.board.size * CELL
+        for i in range(env.board.size + 1):
+            pygame.draw.line(self.canvas, 0, (BOARD_LEFT, BOARD_TOP + i * CELL), (end[0], BOARD_TOP + i * CELL), width=3)
+            pygame.draw.line(self.canvas, 0, (BOARD_LEFT + i * CELL, BOARD_TOP), (BOARD_LEFT + i * CELL, end[1]), width=3)
+        if self.frame_dir is not None:
+            os.makedirs(self.frame_dir, exist_ok=True)
+
+    # cell -> the icon to draw there: a robot, else a charge station, a package on the board, a package's
+    # destination or the destination of a carried package
+    def cell_icons(self, env: WarehouseEnv):
+        icons = {}
+        for i, robot in enumerate(env.robots):
+            if robot.package is not None:
+                icons.setdefault(robot.package.destination, 'robot_%d_destination' % i)
+        for i, package in reversed(list(enumerate(env.packages))):
+            if package.on_board:
+                icons[package.destination] = 'destination_%d' % min(i, 1)
+        for i, package in enumerate(env.packages):
+            if package.on_board and env.get_package_in(package.position) is package:
+                icons[package.position] = 'package_%d' % min(i, 1)
+        for station in env.charge_stations:
+            icons[station.position] = 'charge_station'
+        for i, robot in enumerate(env.robots):
+            icons[robot.position] = 'robot_%d_package' % i if robot.package is not None else 'robot_%d' % i
+        return icons
+
+    def panel_lines(self, robot):
+        lines = ['position: ' + str(robot.position), 'battery: ' + str(robot.battery), 'credit: ' + str(robot.credit)]
+        if robot.package is not None:
+            lines.append('package: ' + str(robot.package.position) + ' -> ' + str(robot.package.destination))
+        return lines
+
+    # redraws the cells whose icon changed, returns the rectangles drawn
+    def draw_cells(self, env: WarehouseEnv):
+        icons = self.cell_icons(env)
+        dirty = []
+        for position in set(icons) | set(self.cells):
+            icon = icons.get(position)
+            if self.cells.get(position) == icon:
+                continue
+            x, y = position
+            rect = pygame.Rect(BOARD_LEFT + x * CELL + 2, BOARD_TOP + y * CELL + 2, CELL - 3, CELL - 3)
+            self.canvas.fill(WHITE, rect)
+            if icon is not None:
+                offset = ICON_FILES[icon][2]
+                self.canvas.blit(self.icons[icon], (rect.left + offset - 2, rect.top + offset - 2))
+            dirty.append(rect)
+        self.cells = icons
+        return dirty
+
+    # redraws the robot panels if a line changed, returns the rectangles drawn
+    def draw_panels(self, env: WarehouseEnv):
+        panels = [self.panel_lines(robot) for robot in env.robots]
+        if panels == self.panels:
+            return []
+        self.canvas.fill(WHITE, PANEL_AREA)
+        for i, lines in enumerate(panels):
+            icon_left, text_left, _ = PANELS[i]
+            self.canvas.blit(self.panel_icons[i], (icon_left, 80))
+            for j, line in enumerate(lines):
+                self.canvas.blit(self.font.render(line, True, BLACK), (text_left, 95 + 20 * j))
+        self.panels = panels
+        return [PANEL_AREA]
+
+    def render(self, env: WarehouseEnv):
+        first = self.canvas is None
+        if first:
+            self.start(env)
+        dirty = self.draw_panels(env) + self.draw_cells(env)
+        if self.window is not None:
+            pygame.event.pump()
+            self.window.blit(self.canvas, (0, 0))
+            if first:
+                pygame.display.update()
+            else:
+                pygame.display.update(dirty)
+        if self.frame_dir is not None:
+            pygame.image.save(self.canvas, os.path.join(self.frame_dir, 'frame_%06d.png' % self.frame))
+        self.frame += 1
+        if self.fps:
+            self.clock.tick(self.fps)
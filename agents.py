@@ -0,0 +1,26 @@
+import Agent
+import submission
+from EndgameTablebase import EndgameTablebase
+
+# the agents main.py and AgentServer.py play, by the name they are given on the command line
+agents = {
+    "random": Agent.AgentRandom,
+    "greedy": Agent.AgentGreedy,
+    "greedyImproved": submission.AgentGreedyImproved,
+    "minimax": submission.AgentMinimax,
+    "alphabeta": submission.AgentAlphaBeta,
+    "expectimax": submission.AgentExpectimax,
+    "mcts": submission.AgentMCTS,
+    "hardcoded": submission.AgentHardCoded,
+}
+
+
+# the search agents consult the endgame table file tablebase if one is given
+def make_agent(agent_name, search_workers=1, ponder=False, tablebase=None):
+    agent_class = agents[agent_name]
+    if issubclass(agent_class, submission.RBAgent):
+        agent = agent_class(workers=search_workers, ponder=ponder)
+        if tablebase is not None:
+            agent.tablebase = EndgameTablebase(tablebase)
+        return agent
+    return agent_class()
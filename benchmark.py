@@ -0,0 +1,396 @@
+import argparse
+import functools
+import json
+import math
+import random
+import sys
+import time
+
+from GameRecord import read_records
+from PackedState import PackedEnv, packable, pack_state, unpack_state
+from WarehouseEnv import WarehouseEnv, board_size
+import submission
+
+# (seed, plies): the position reached from generate(seed) after the robots play plies moves of
+# AgentGreedyImproved, which breaks ties deterministically
+CORPUS = [(0, 0), (1, 6), (2, 12), (3, 20), (4, 30), (5, 40), (17, 9), (42, 25), (101, 50), (250, 34)]
+COUNT_STEPS = 4761
+# (board size, robots) of the scaling runs, with as many packages and charge stations as robots. each is
+# measured on these seeds after every robot played three moves
+LAYOUTS = ['5x2', '20x4', '50x8']
+LAYOUT_SEEDS = [0, 1, 2]
+
+search_agents = {
+    "minimax": submission.AgentMinimax,
+    "alphabeta": submission.AgentAlphaBeta,
+    "alphabetaPacked": functools.partial(submission.AgentAlphaBeta, packed=True),
+    "expectimax": submission.AgentExpectimax,
+    # minimax and expectimax batch their last ply when numpy is available, these never do
+    "minimaxNoBatch": functools.partial(submission.AgentMinimax, batch_evaluation=False),
+    "expectimaxNoBatch": functools.partial(submission.AgentExpectimax, batch_evaluation=False),
+}
+
+
+def build_position(seed, plies, size=board_size, robots=2):
+    env = WarehouseEnv(size)
+    env.generate(seed, robots * COUNT_STEPS, robots, robots, robots)
+    prefix = submission.AgentGreedyImproved()
+    for ply in range(plies):
+        env.apply_operator(ply % robots, prefix.run_step(env, ply % robots, 1))
+    return env
+
+
+def parse_layout(text):
+    size, robots = text.split('x')
+    return int(size), int(robots)
+
+
+def corpus():
+    return [(seed, plies, build_position(seed, plies)) for seed, plies in CORPUS]
+
+
+# (seed, plies, position) every interval plies of the recorded two robot games on the default board that are
+# still going on
+def record_corpus(path, interval):
+    positions = []
+    for record in read_records(path):
+        if len(record.agent_names) != 2 or record.size != board_size:
+            continue
+        positions += [(record.seed, plies, env) for plies, env in record.positions(interval) if not env.done()]
+    return positions
+
+
+# average microseconds per call of the engine's innermost operations over the corpus, best of rounds
+def bench_primitives(positions, repeat, rounds):
+    envs = [env for _, _, env in positions]
+    agent = submission.AgentAlphaBeta()
+
+    def apply_undo(env):
+        for op in env.get_legal_operators(0):
+            env.undo_operator(env.apply_operator(0, op))
+
+    primitives = {
+        'clone': lambda env: env.clone(),
+        'get_legal_operators': lambda env: env.get_legal_operators(0),
+        'apply_undo': apply_undo,
+        'smart_heuristic': lambda env: submission.smart_heuristic(env, 0),
+        'heuristic': lambda env: agent.heuristic(env, 0),
+    }
+    if all(packable(env) for env in envs):
+        packed = {id(env): PackedEnv(pack_state(env)) for env in envs}
+
+        def packed_apply_undo(env):
+            state = packed[id(env)]
+            for code in state.get_legal_codes(0):
+                state.undo_operator(state.apply_code(0, code))
+
+        primitives.update({
+            'pack_state': pack_state,
+            'unpack_state': lambda env: unpack_state(packed[id(env)].state),
+            'packed_legal_codes': lambda env: packed[id(env)].get_legal_codes(0),
+            'packed_apply_undo': packed_apply_undo,
+            'packed_heuristic': lambda env: agent.heuristic(packed[id(env)], 0),
+        })
+    records = []
+    for name, primitive in primitives.items():
+        elapsed = math.inf
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for env in envs:
+                    primitive(env)
+            elapsed = min(elapsed, time.perf_counter() - start)
+        records.append({'kind': 'primitive', 'name': name, 'us_per_call': elapsed / (repeat * len(envs)) * 1e6})
+    return records
+
+
+# a single search of each depth from an empty transposition table, best of rounds
+def bench_fixed_depth(positions, agent_names, depths, rounds):
+    records = []
+    for agent_name in agent_names:
+        for seed, plies, env in positions:
+            robot_id = plies % 2
+            for depth in depths:
+                elapsed = math.inf
+                for _ in range(rounds):
+                    random.seed(0)
+                    agent = search_agents[agent_name]()
+                    agent.begin_turn(env, time.perf_counter(), math.inf)
+                    start = time.perf_counter()
+                    op = agent.search(env.clone(), robot_id, depth)
+                    elapsed = min(elapsed, time.perf_counter() - start)
+                records.append({'kind': 'depth', 'agent': agent_name, 'seed': seed, 'plies': plies, 'depth': depth,
+                                'move': op, 'nodes': agent.nodes, 'seconds': elapsed,
+                                'nodes_per_second': agent.nodes / elapsed if elapsed > 0 else 0})
+    return records
+
+
+def bench_time_limit(positions, agent_names, time_limits):
+    records = []
+    for agent_name in agent_names:
+        for seed, plies, env in positions:
+            robot_id = plies % 2
+            for time_limit in time_limits:
+                random.seed(0)
+                agent = search_agents[agent_name]()
+                times = []
+
+                def completed(depth, scores):
+                    times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                agent.begin_turn(env, time.perf_counter(), time_limit)
+                op = agent.deepen(env.clone(), robot_id, completed=completed)
+                elapsed = time.perf_counter() - start
+                records.append({'kind': 'time', 'agent': agent_name, 'seed': seed, 'plies': plies,
+                                'time_limit': time_limit, 'move': op, 'depth': len(times) - 1,
+                                'time_to_depth': times, 'nodes': agent.nodes, 'seconds': elapsed,
+                                'nodes_per_second': agent.nodes / elapsed if elapsed > 0 else 0})
+    return records
+
+
+# AgentGreedyImproved has no depth or time limit, it expands and evaluates the children of the root once
+def bench_greedy(positions, repeat, rounds):
+    records = []
+    agent = submission.AgentGreedyImproved()
+    for seed, plies, env in positions:
+        robot_id = plies % 2
+        elapsed = math.inf
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                op = agent.run_step(env, robot_id, 1)
+            elapsed = min(elapsed, (time.perf_counter() - start) / repeat)
+        nodes = len(env.get_legal_operators(robot_id))
+        records.append({'kind': 'greedy', 'agent': 'greedyImproved', 'seed': seed, 'plies': plies, 'move': op,
+                        'nodes': nodes, 'seconds': elapsed, 'nodes_per_second': nodes / elapsed if elapsed > 0 else 0})
+    return records
+
+
+# the search primitives and a fixed depth search of each agent on larger boards with more robots, best of rounds
+def bench_layouts(layouts, agent_names, depth, repeat, rounds):
+    records = []
+    for layout in layouts:
+        size, robots = parse_layout(layout)
+        start = time.perf_counter()
+        positions = [(seed, build_position(seed, 3 * robots, size, robots)) for seed in LAYOUT_SEEDS]
+        records.append({'kind': 'layout_setup', 'layout': layout, 'seconds': time.perf_counter() - start})
+        agent = submission.AgentAlphaBeta()
+
+        def apply_undo(env):
+            for code in env.get_legal_codes(0):
+                env.undo_operator(env.apply_code(0, code))
+
+        primitives = {
+            'clone': lambda env: env.clone(),
+            'get_legal_codes': lambda env: env.get_legal_codes(0),
+            'apply_undo': apply_undo,
+            'heuristic': lambda env: agent.heuristic(env, 0),
+        }
+        for name, primitive in primitives.items():
+            elapsed = math.inf
+            for _ in range(rounds):
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    for _, env in positions:
+                        primitive(env)
+                elapsed = min(elapsed, time.perf_counter() - start)
+            records.append({'kind': 'layout_primitive', 'layout': layout, 'name': name,
+                            'us_per_call': elapsed / (repeat * len(positions)) * 1e6})
+
+        for agent_name in agent_names:
+            for seed, env in positions:
+                elapsed = math.inf
+                for _ in range(rounds):
+                    random.seed(0)
+                    agent = search_agents[agent_name]()
+                    agent.begin_turn(env, time.perf_counter(), math.inf)
+                    start = time.perf_counter()
+                    op = agent.search(env.clone(), 0, depth)
+                    elapsed = min(elapsed, time.perf_counter() - start)
+                records.append({'kind': 'layout_depth', 'layout': layout, 'agent': agent_name, 'seed': seed,
+                                'depth': depth, 'move': op, 'nodes': agent.nodes, 'seconds': elapsed,
+                                'nodes_per_second': agent.nodes / elapsed if elapsed > 0 else 0})
+    return records
+
+
+# the paranoid value for agent_id of env with turn to move and depth plies left, by plain recursion over clones.
+# it shares only the heuristic with the agents: no transposition table, hashing, move ordering or undo
+def reference_minimax(heuristic, env, agent_id, depth, turn):
+    if env.done() or depth == 0:
+        return heuristic(env, agent_id)
+    values = []
+    for op in env.get_legal_operators(turn):
+        child = env.clone()
+        child.apply_operator(turn, op)
+        values.append(reference_minimax(heuristic, child, agent_id, depth - 1, (turn + 1) % len(env.robots)))
+    return max(values) if turn == agent_id else min(values)
+
+
+# AgentMinimax and AgentAlphaBeta with and without principal variation search against reference_minimax at equal
+# depth: the best root value must be the same and the chosen move one of the reference's best moves. the endgame
+# table is left out, its probes are keyed by the hash the reference does without
+def verify_alphabeta(positions, depths):
+    records = []
+    for seed, plies, env in positions:
+        robot_id = plies % 2
+        other_id = (robot_id + 1) % len(env.robots)
+        for depth in depths:
+            agents = {'minimax': submission.AgentMinimax(), 'alphabeta': submission.AgentAlphaBeta(pvs=False),
+                      'pvs': submission.AgentAlphaBeta()}
+            results = {}
+            for agent_name, agent in agents.items():
+                random.seed(0)
+                agent.tablebase = None
+                agent.begin_turn(env, time.perf_counter(), math.inf)
+                op = agent.search(env.clone(), robot_id, depth)
+                results[agent_name] = (op, agent.root_scores[op], agent.nodes)
+            heuristic = agents['minimax'].heuristic
+            scores = {}
+            for op in env.get_legal_operators(robot_id):
+                child = env.clone()
+                child.apply_operator(robot_id, op)
+                scores[op] = reference_minimax(heuristic, child, robot_id, depth, other_id)
+            value = max(scores.values())
+            moves = [op for op in scores if scores[op] == value]
+            records.append({'kind': 'verify', 'seed': seed, 'plies': plies, 'depth': depth, 'value': value,
+                            'moves': moves,
+                            'match': all(results[agent_name][0] in moves and results[agent_name][1] == value
+                                         for agent_name in agents),
+                            'move': {agent_name: result[0] for agent_name, result in results.items()},
+                            'nodes': {agent_name: result[2] for agent_name, result in results.items()}})
+    return records
+
+
+def record_key(record):
+    if record['kind'] == 'primitive':
+        return 'primitive', record['name']
+    if record['kind'] == 'layout_setup':
+        return 'layout_setup', record['layout']
+    if record['kind'] == 'layout_primitive':
+        return 'layout_primitive', record['layout'], record['name']
+    if record['kind'] == 'layout_depth':
+        return 'layout_depth', record['layout'], record['agent'], record['seed'], record['depth']
+    if record['kind'] == 'depth':
+        return 'depth', record['agent'], record['seed'], record['plies'], record['depth']
+    if record['kind'] == 'time':
+        return 'time', record['agent'], record['seed'], record['plies'], record['time_limit']
+    if record['kind'] == 'verify':
+        return 'verify', record['seed'], record['plies'], record['depth']
+    return 'greedy', record['agent'], record['seed'], record['plies']
+
+
+# returns the lines describing regressions against the baseline run. a search of a few milliseconds is too noisy
+# to gate on alone, so the searches are gated on the geometric mean of their slowdowns per agent and kind
+def compare(records, baseline, tolerance):
+    previous = {record_key(record): record for record in baseline}
+    regressions = []
+    # (kind, layout, agent) -> how many times slower each search of the group ran
+    slowdowns = {}
+    for record in records:
+        key = record_key(record)
+        old = previous.get(key)
+        if old is None:
+            continue
+        if record['kind'] == 'time':
+            # the depth a time limited run reaches is too noisy to gate on the move or a single depth
+            if record['depth'] < (old['depth'] - 1) * (1 - tolerance):
+                regressions.append('%s: depth %d -> %d' % (key, old['depth'], record['depth']))
+            continue
+        if record['kind'] == 'layout_setup':
+            # building a large board's tables is a one time cost, it is reported but not gated on
+            continue
+        if record['kind'] == 'verify':
+            if record['nodes']['pvs'] > old['nodes']['pvs'] * (1 + tolerance):
+                regressions.append('%s: %d -> %d pvs nodes' % (key, old['nodes']['pvs'], record['nodes']['pvs']))
+            continue
+        if record['kind'] in ('primitive', 'layout_primitive'):
+            ratio = record['us_per_call'] / old['us_per_call']
+            if ratio > 1 + tolerance:
+                regressions.append('%s: %.2fus -> %.2fus (x%.2f)' % (key, old['us_per_call'], record['us_per_call'],
+                                                                     ratio))
+            continue
+        if record['move'] != old['move']:
+            regressions.append('%s: move %s -> %s' % (key, old['move'], record['move']))
+        if old['nodes_per_second']:
+            ratio = old['nodes_per_second'] / record['nodes_per_second'] if record['nodes_per_second'] else math.inf
+            slowdowns.setdefault((record['kind'], record.get('layout'), record['agent']), []).append(ratio)
+    for group, ratios in slowdowns.items():
+        mean = math.exp(sum(math.log(ratio) for ratio in ratios) / len(ratios))
+        if mean > 1 + tolerance:
+            regressions.append('%s: x%.2f slower nodes/s on average over %d searches' % (group, mean, len(ratios)))
+    return regressions
+
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description='Benchmark the search agents on a fixed corpus of positions.')
+    parser.add_argument('-a', '--agents', nargs='+', default=['minimax', 'alphabeta', 'expectimax', 'greedyImproved'],
+                        choices=list(search_agents) + ['greedyImproved'])
+    parser.add_argument('-d', '--depths', nargs='*', type=int, default=[2, 4, 6])
+    parser.add_argument('-t', '--time_limits', nargs='*', type=float, default=[0.2, 1])
+    parser.add_argument('-r', '--repeat', type=int, default=200, help='Repetitions of the primitive timings')
+    parser.add_argument('-l', '--layouts', nargs='*', default=LAYOUTS, type=str,
+                        help='SIZExROBOTS layouts of the scaling runs, e.g. 20x4 for a 20x20 board with 4 robots')
+    parser.add_argument('--layout_depth', type=int, default=4, help='Search depth of the scaling runs')
+    parser.add_argument('--rounds', type=int, default=5, help='Timings are the best of this many rounds')
+    parser.add_argument('-o', '--output', help='Write the records as JSON lines to this file instead of stdout')
+    parser.add_argument('-b', '--baseline', help='JSON lines file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown against the baseline before it counts as a regression')
+    parser.add_argument('--records', help='Take the positions from the games of this GameRecord file instead of the '
+                                          'built in corpus')
+    parser.add_argument('--record_interval', type=int, default=50,
+                        help='Plies between the positions taken from each recorded game')
+    parser.add_argument('--verify', action='store_true',
+                        help='Only check the minimax and alpha-beta agents against a plain recursive minimax at the '
+                             'given depths, failing on any difference')
+    args = parser.parse_args()
+    for layout in args.layouts:
+        try:
+            size, robots = parse_layout(layout)
+        except ValueError:
+            parser.error('layouts are written SIZExROBOTS, not ' + layout)
+        if robots < 2 or robots > size * size:
+            parser.error('layout ' + layout + ' needs from 2 robots up to one per cell')
+
+    positions = record_corpus(args.records, args.record_interval) if args.records else corpus()
+    if args.verify:
+        records = verify_alphabeta(positions, args.depths)
+    else:
+        search_names = [agent_name for agent_name in args.agents if agent_name in search_agents]
+        records = bench_primitives(positions, args.repeat, args.rounds)
+        records += bench_fixed_depth(positions, search_names, args.depths, args.rounds)
+        records += bench_time_limit(positions, search_names, args.time_limits)
+        if 'greedyImproved' in args.agents:
+            records += bench_greedy(positions, args.repeat, args.rounds)
+        records += bench_layouts(args.layouts, search_names, args.layout_depth, args.repeat, args.rounds)
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    for record in records:
+        out.write(json.dumps(record) + '\n')
+    if args.output:
+        out.close()
+
+    if args.verify:
+        nodes = {agent_name: sum(record['nodes'][agent_name] for record in records)
+                 for agent_name in ('minimax', 'alphabeta', 'pvs')}
+        failed = [record_key(record) for record in records if not record['match']]
+        for key in failed:
+            print('MISMATCH', key, file=sys.stderr)
+        print('nodes', nodes, file=sys.stderr)
+        if failed:
+            sys.exit(1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = [json.loads(line) for line in f if line.strip()]
+        regressions = compare(records, baseline, args.tolerance)
+        for line in regressions:
+            print('REGRESSION', line, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print('no regressions against', args.baseline, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,10 +1,132 @@
 import random
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from WarehouseEnv import WarehouseEnv
+from AgentServer import RemoteAgent
+from agents import agents, make_agent
+from GameRecord import GameWriter
+from SearchTelemetry import JsonlSink
+from WarehouseEnv import WarehouseEnv, board_size
 import argparse
 import submission
-import Agent
+
+REMOTE = 'remote-'
+
+
+# remote-<agent> robots are played by an AgentServer listening at server
+def make_robot(agent_name, search_workers=1, ponder=False, server=None, tablebase=None):
+    if agent_name.startswith(REMOTE):
+        return RemoteAgent(server, agent_name[len(REMOTE):])
+    return make_agent(agent_name, search_workers, ponder, tablebase)
+
+
+# plays one game with a fresh agent per robot and returns the final balances
+def play_game(agent_names, seed, count_steps, time_limit, console_print=False, renderer=None, search_workers=1,
+              telemetry=None, ponder=False, size=board_size, package_count=2, station_count=2, record=None,
+              server=None, tablebase=None):
+    random.seed(seed)
+    robots = [make_robot(agent_name, search_workers, ponder, server, tablebase) for agent_name in agent_names]
+    sink = None
+    if telemetry is not None:
+        sink = JsonlSink(telemetry, seed=seed)
+        for agent in robots:
+            if isinstance(agent, (submission.RBAgent, submission.AgentMCTS)):
+                agent.telemetry = sink
+    env = WarehouseEnv(size)
+    env.generate(seed, len(robots)*count_steps, len(robots), package_count, station_count)
+    writer = GameWriter(record, seed, count_steps, agent_names, env) if record is not None else None
+
+    if console_print:
+        print('initial board:')
+        env.print()
+
+    if renderer is not None:
+        renderer.render(env)
+
+    try:
+        for _ in range(count_steps):
+            for i, agent in enumerate(robots):
+                start = time.perf_counter()
+                op = agent.run_step(env, i, time_limit)
+                end = time.perf_counter()
+                if end - start > time_limit:
+                    raise RuntimeError("Agent used too much time!")
+                env.apply_operator(i, op)
+                if writer is not None:
+                    writer.append(op)
+                for other in robots:
+                    if other is not agent and isinstance(other, submission.RBAgent):
+                        other.stop_pondering()
+                if console_print:
+                    print('robot ' + str(i) + ' chose ' + op)
+                    env.print()
+                if renderer is not None:
+                    renderer.render(env)
+            if env.done():
+                break
+    finally:
+        # a game that goes wrong is recorded up to its last move
+        if writer is not None:
+            writer.close()
+    for agent in robots:
+        if isinstance(agent, (submission.RBAgent, RemoteAgent)):
+            agent.close()
+    if sink is not None:
+        sink.close()
+    return env.get_balances()
+
+
+# game k uses seed + k and reverses the order the agents play the robots in on odd k
+def tournament_game(agent_names, seed, count_steps, time_limit, game_index, search_workers=1, telemetry=None,
+                    ponder=False, size=board_size, package_count=2, station_count=2, record=None, server=None,
+                    console_print=False, renderer=None, tablebase=None):
+    if game_index % 2 == 1:
+        agent_names = agent_names[::-1]
+    return game_index, agent_names, play_game(agent_names, seed + game_index, count_steps, time_limit,
+                                              console_print, renderer, search_workers=search_workers,
+                                              telemetry=telemetry, ponder=ponder, size=size,
+                                              package_count=package_count, station_count=station_count,
+                                              record=record, server=server, tablebase=tablebase)
+
+
+def run_tournament(args, agent_names, renderer=None):
+    wins = {agent_name: 0 for agent_name in agent_names}
+    robot_wins = [0] * len(agent_names)
+    draws = 0
+
+    def report(game_index, names, balances):
+        nonlocal draws
+        if balances.count(max(balances)) > 1:
+            draws += 1
+            result = 'draw'
+        else:
+            winner = balances.index(max(balances))
+            robot_wins[winner] += 1
+            wins[names[winner]] += 1
+            result = 'robot ' + str(winner) + ' (' + names[winner] + ') wins'
+        print('game', game_index, 'seed', args.seed + game_index, names, balances, result, flush=True)
+
+    # the settings every game of the tournament is played with
+    settings = dict(search_workers=args.search_workers, telemetry=args.telemetry, ponder=args.ponder,
+                    size=args.board_size, package_count=args.packages, station_count=args.stations,
+                    record=args.record, server=args.server, tablebase=args.endgame_table)
+    if args.workers == 1:
+        for game_index in range(args.games):
+            report(*tournament_game(agent_names, args.seed, args.count_steps, args.time_limit, game_index,
+                                    console_print=args.console_print, renderer=renderer, **settings))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(tournament_game, agent_names, args.seed, args.count_steps, args.time_limit,
+                                       game_index, **settings)
+                       for game_index in range(args.games)]
+            for future in as_completed(futures):
+                report(*future.result())
+
+    for i, robot_win in enumerate(robot_wins):
+        print("Robot " + str(i) + " wins: ", robot_win)
+    for agent_name in dict.fromkeys(agent_names):
+        print(agent_name, "wins: ", wins[agent_name])
+    print("Draws: ", draws)
 
 
 def run_agents():
@@ -13,107 +135,86 @@ def run_agents():
                         help='First agent')
     parser.add_argument('agent1', type=str,
                         help='Second agent')
+    parser.add_argument('more_agents', type=str, nargs='*',
+                        help='Agents of robots 2 and up, one robot is added to the game per agent')
     parser.add_argument('-t', '--time_limit', type=float, nargs='?', help='Time limit for each turn in seconds', default=1)
     parser.add_argument('-s', '--seed', nargs='?', type=int, help='Seed to be used for generating the game',
                         default=random.randint(0, 255))
     parser.add_argument('-c', '--count_steps', nargs='?', type=int, help='Number of steps each robot gets before game is over',
                         default=4761)
+    parser.add_argument('-b', '--board_size', type=int, default=board_size, help='Width and height of the board')
+    parser.add_argument('--packages', type=int, default=2, help='Number of packages on the board at a time')
+    parser.add_argument('--stations', type=int, default=2, help='Number of charge stations')
     parser.add_argument('--console_print', action='store_true')
 
     parser.add_argument('--screen_print', action='store_true')
+    parser.add_argument('--fps', type=float, default=5,
+                        help='Frames per second of --screen_print and --frames, 0 for as fast as the game goes')
+    parser.add_argument('--frames', help='Save every frame of the game as a PNG in this directory, without a window '
+                                         'unless --screen_print is given too')
 
     parser.add_argument('--tournament', action='store_true')
+    parser.add_argument('-g', '--games', type=int, help='Number of games in a tournament', default=100)
+    parser.add_argument('-w', '--workers', type=int, help='Number of processes playing tournament games in parallel',
+                        default=1)
+    parser.add_argument('--search_workers', type=int, default=1,
+                        help='Number of processes each minimax/alphabeta/expectimax agent searches with')
+    parser.add_argument('--telemetry', help='Append a JSON line describing every search turn to this file')
+    parser.add_argument('--server', help='HOST:PORT or unix socket path of the AgentServer that plays the '
+                                         'remote-<agent> robots, e.g. remote-alphabeta')
+    parser.add_argument('--record', help='Append a binary record of every game to this file, replay it with '
+                                         'GameRecord.py')
+    parser.add_argument('--endgame_table', help='Endgame table file, written by EndgameTablebase.py, for the '
+                                                'minimax/alphabeta/expectimax agents to look solved positions up in')
+    parser.add_argument('--ponder', action='store_true',
+                        help='minimax/alphabeta/expectimax agents keep searching in a background process during the '
+                             'opponent\'s turn')
 
     args = parser.parse_args()
 
-    agents = {
-        "random": Agent.AgentRandom(),
-        "greedy": Agent.AgentGreedy(),
-        "greedyImproved": submission.AgentGreedyImproved(),
-        "minimax": submission.AgentMinimax(),
-        "alphabeta": submission.AgentAlphaBeta(),
-        "expectimax": submission.AgentExpectimax(),
-        "hardcoded": submission.AgentHardCoded(),
-    }
+    if args.search_workers < 1:
+        parser.error('--search_workers must be at least 1')
 
     # agent_names = sys.argv
-    agent_names = [args.agent0, args.agent1]
-    env = WarehouseEnv()
+    agent_names = [args.agent0, args.agent1] + args.more_agents
+    for agent_name in agent_names:
+        remote = agent_name.startswith(REMOTE)
+        if remote and args.server is None:
+            parser.error(agent_name + ' needs the --server that hosts it')
+        if (agent_name[len(REMOTE):] if remote else agent_name) not in agents:
+            parser.error('unknown agent ' + agent_name + ', choose from ' + ', '.join(agents) +
+                         ' or their ' + REMOTE + ' versions')
+    if args.board_size < 2 or args.packages < 1 or args.stations < 0:
+        parser.error('the board must be at least 2x2 with at least one package')
+    if max(len(agent_names), args.stations) > args.board_size ** 2:
+        parser.error('more robots or charge stations than cells on the board')
+
+    if args.tournament:
+        if args.workers < 1:
+            parser.error('--workers must be at least 1')
+        # games in other processes cannot print or draw here
+        if args.workers > 1 and (args.console_print or args.screen_print or args.frames):
+            parser.error('--console_print, --screen_print and --frames need --workers 1 in a tournament')
+
+    # pygame is only imported when the game is shown on screen
+    renderer = None
+    if args.screen_print or args.frames:
+        if args.board_size != board_size or len(agent_names) != 2 or args.packages != 2:
+            parser.error('--screen_print and --frames draw the default 5x5 board with two robots and two packages')
+        from WarehouseRenderer import WarehouseRenderer
+        renderer = WarehouseRenderer(args.fps or None, not args.screen_print, args.frames)
 
     if not args.tournament:
-        env.generate(args.seed, 2*args.count_steps)
-
-        if args.console_print:
-            print('initial board:')
-            env.print()
-
-        if args.screen_print:
-            env.pygame_print()
-
-        for _ in range(args.count_steps):
-            for i, agent_name in enumerate(agent_names):
-                agent = agents[agent_name]
-                start = time.time()
-                op = agent.run_step(env, i, args.time_limit)
-                end = time.time()
-                if end - start > args.time_limit:
-                    raise RuntimeError("Agent used too much time!")
-                env.apply_operator(i, op)
-                if args.console_print:
-                    print('robot ' + str(i) + ' chose ' + op)
-                    env.print()
-                if args.screen_print:
-                    env.pygame_print()
-            if env.done():
-                break
-        balances = env.get_balances()
+        balances = play_game(agent_names, args.seed, args.count_steps, args.time_limit, args.console_print, renderer,
+                             args.search_workers, args.telemetry, args.ponder, args.board_size, args.packages,
+                             args.stations, args.record, args.server, args.endgame_table)
         print(balances)
-        if balances[0] == balances[1]:
+        if balances.count(max(balances)) > 1:
             print('draw')
         else:
             print('robot', balances.index(max(balances)), 'wins!')
     else:
-        robot0_wins = 0
-        robot1_wins = 0
-        draws = 0
-        num_of_games = 100
-
-        for i in range(num_of_games):
-            env.generate(args.seed + i, 2*args.count_steps)
-            if args.console_print:
-                print('initial board:')
-                env.print()
-            if args.screen_print:
-                env.pygame_print()
-
-            for _ in range(args.count_steps):
-                for i, agent_name in enumerate(agent_names):
-                    agent = agents[agent_name]
-                    start = time.time()
-                    op = agent.run_step(env, i, args.time_limit)
-                    end = time.time()
-                    if end - start > args.time_limit:
-                        raise RuntimeError("Agent used too much time!")
-                    env.apply_operator(i, op)
-                if args.console_print:
-                    print('robot ' + str(i) + ' chose ' + op)
-                    env.print()
-                if args.screen_print:
-                    env.pygame_print()
-                if env.done():
-                    break
-            balances = env.get_balances()
-            if balances[0] == balances[1]:
-                draws += 1
-            elif balances[0] > balances[1]:
-                robot0_wins += 1
-            else:
-                robot1_wins += 1
-        print("Robot 0 wins: ", robot0_wins)
-        print("Robot 1 wins: ", robot1_wins)
-        print("Draws: ", draws)
-
-
+        run_tournament(args, agent_names, renderer)
 
 
 if __name__ == "__main__":
@@ -1,38 +1,65 @@
+import gc
 import math
 import time
 
 from Agent import Agent, AgentGreedy
-from WarehouseEnv import WarehouseEnv, manhattan_distance
+import BatchEvaluation
+from BatchEvaluation import children_heuristics
+from EndgameTablebase import WIN, DRAW
+from OpeningBook import OpeningBook, book_path
+from PackedState import PackedEnv, packable, pack_state, smart_heuristic as packed_heuristic
+from ParallelSearch import SearchPool
+from SearchTelemetry import instrumented_run_step
+from TranspositionTable import TranspositionTable, EXACT, LOWER, UPPER
+from WarehouseEnv import WarehouseEnv, zobrist_key, operator_code, operator_name, CHARGE, \
+    PICK_UP, DROP_OFF
 import random
 
+# root values this close below the best are searched again without a window, the rounding in a pruned chance
+# node's bounds is far smaller. it is also the width of the null windows of principal variation search
+TIE_MARGIN = 1e-6
+
 
 # TODO: section a : 3
 def utility(env: WarehouseEnv, taxi_id: int):
     if env.done():
         agent = env.get_robot(taxi_id)
-        other = env.get_robot((taxi_id + 1) % 2)
-        if agent.credit > other.credit:
+        other_credit = max(robot.credit for i, robot in enumerate(env.robots) if i != taxi_id)
+        if agent.credit > other_credit:
             return math.inf
-        if agent.credit < other.credit:
+        if agent.credit < other_credit:
             return -math.inf
         else:
             return -50
     return None
 
 
+# what utility() gives robot taxi_id at the end of a game whose outcome for robot 0 is known
+def outcome_utility(outcome, taxi_id: int):
+    if outcome == DRAW:
+        return -50
+    return math.inf if (outcome == WIN) == (taxi_id == 0) else -math.inf
+
+
 def smart_heuristic(env: WarehouseEnv, taxi_id: int):
     agent = env.get_robot(taxi_id)
+    distance = env.board.distance
+    target = env.target_distance(agent)
 
     if agent.package is not None:
         return (agent.credit * 1000) \
-            + (manhattan_distance(agent.package.position, agent.package.destination)) \
-            - manhattan_distance(agent.position, agent.package.destination) \
+            + (distance[agent.package.cell][agent.package.destination_cell]) \
+            - target \
             + 100
 
-    available_packages = [p for p in env.packages if p.on_board]
-    p = sorted(available_packages, key=lambda p: manhattan_distance(agent.position, p.position))[0]
+    return (agent.credit * 1000) - target
+
 
-    return (agent.credit * 1000) - manhattan_distance(agent.position, p.position)
+# the best smart_heuristic of the other robots, with more than two robots the search plays them all against taxi_id
+def rival_heuristic(env: WarehouseEnv, taxi_id: int):
+    if len(env.robots) == 2:
+        return smart_heuristic(env, 1 - taxi_id)
+    return max([smart_heuristic(env, i) for i in range(len(env.robots)) if i != taxi_id])
 
 
 class AgentGreedyImproved(AgentGreedy):
@@ -41,51 +68,297 @@ class AgentGreedyImproved(AgentGreedy):
 
 
 class RBAgent(Agent):
-    def __init__(self):
+    def __init__(self, workers=1, ponder=False, batch_evaluation=False):
         self.time_limit = None
         self.start_time = None
-
-    def check_time(self, epsilon=5e-2):
-        elapsed_time = time.time() - self.start_time
-        if elapsed_time >= self.time_limit - epsilon:
-            raise TimeoutError
+        # the search stops at deadline, time_margin before the time limit, reading the clock every check_interval nodes
+        self.deadline = None
+        self.time_margin = 2e-2
+        self.check_interval = 64
+        self.next_check = 0
+        # also stops the search when it returns true, see ponder
+        self.interrupt = None
+        # kept across the turns of a game, cleared when a new game starts
+        self.tt = TranspositionTable()
+        self.last_num_steps = None
+        self.nodes = 0
+        self.cutoffs = 0
+        # called with a dict describing every turn, see SearchTelemetry
+        self.telemetry = None
+        # operator -> its value in the last completed search
+        self.root_scores = {}
+        # operator -> its value for the root operators the current search has finished so far
+        self.iteration_scores = {}
+        # the depth the last deepen() ran out of time in (None if it stopped by itself), and whether its
+        # partial result was used
+        self.aborted_depth = None
+        self.partial_result = False
+        # with more than one worker the root operators are split between that many processes
+        self.workers = workers
+        self.pool = None
+        # keep searching in the pool's processes during the opponent's turn
+        self.pondering = ponder
+        # evaluate the children of depth 1 nodes together, needs numpy (see BatchEvaluation.available)
+        self.batch_evaluation = batch_evaluation
+        # an EndgameTablebase of exact outcomes of solved endgames, or None. unset by default: its keys are exact
+        # positions, absolute credits and spawn seed included, so few real games reach one, and while a search may
+        # reach it the probes cost every leaf and AgentExpectimax cannot prune
+        self.tablebase = None
+        # the operators a deep search chose in the opening positions, or None
+        self.book = OpeningBook(book_path(type(self).__name__))
+
+    # worker processes get a copy without the pool and with an empty transposition table of their own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['pool'] = None
+        state['telemetry'] = None
+        state['interrupt'] = None
+        state['tt'] = len(self.tt.slots)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tt = TranspositionTable(state['tt'])
+
+    def check_time(self):
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.next_check = self.nodes + self.check_interval
+            if time.perf_counter() >= self.deadline or (self.interrupt is not None and self.interrupt()):
+                raise TimeoutError
 
     def heuristic(self, env: WarehouseEnv, agent_id: int):
         if env.done():
             return utility(env, agent_id)
-        return smart_heuristic(env, agent_id) - smart_heuristic(env, (agent_id + 1) % 2)
+        tablebase = self.tablebase
+        if tablebase is not None and env.num_steps <= tablebase.max_steps:
+            outcome = tablebase.probe(env)
+            if outcome is not None:
+                return outcome_utility(outcome, agent_id)
+        return smart_heuristic(env, agent_id) - rival_heuristic(env, agent_id)
+
+    # the heuristic values of the children reached by operators, or None if they should be searched one by one
+    def leaf_values(self, env: WarehouseEnv, agent_id, turn, operators):
+        # the batch knows only smart_heuristic, the children may have exact values
+        if not self.batch_evaluation or (self.tablebase is not None and self.tablebase.may_contain(env, 1)):
+            return None
+        self.check_time()
+        self.nodes += len(operators) - 1
+
+        def leaf_value(env, turn, op):
+            record = env.apply_code(turn, op)
+            value = self.heuristic(env, agent_id)
+            env.undo_operator(record)
+            return value
+
+        return children_heuristics(env, turn, operators, agent_id, smart_heuristic, leaf_value)
+
+    # the opening book's operator, unless the book's search could have reached the endgame table
+    def book_operator(self, env: WarehouseEnv, agent_id):
+        operator = self.book.probe(env, agent_id)
+        if operator is None or operator not in env.get_legal_operators(agent_id):
+            return None
+        if self.tablebase is not None and self.tablebase.may_contain(env, self.book.depth):
+            return None
+        return operator
 
     def run_step(self, env: WarehouseEnv, agent_id, time_limit):
-        self.start_time = time.time()
+        start_time = time.perf_counter()
+        operator = self.book_operator(env, agent_id) if self.book is not None else None
+        if operator is not None:
+            if self.telemetry is not None:
+                self.telemetry({'agent': type(self).__name__, 'robot': agent_id, 'num_steps': env.num_steps,
+                                'time_limit': time_limit, 'operator': operator, 'book': True})
+            return operator
+        if self.workers > 1 or self.pondering:
+            if self.pool is None:
+                self.pool = SearchPool(self, self.workers)
+            operator = self.pool.run_step(env, agent_id, start_time, time_limit)
+            if self.telemetry is not None:
+                self.telemetry({'agent': type(self).__name__, 'robot': agent_id, 'num_steps': env.num_steps,
+                                'time_limit': time_limit, 'operator': operator, 'workers': self.workers,
+                                'completed_depth': self.pool.completed_depth})
+            if self.pondering:
+                self.pool.ponder(env, agent_id, operator)
+            return operator
+        self.begin_turn(env, start_time, time_limit)
+        if self.telemetry is not None:
+            return instrumented_run_step(self, env, agent_id, self.telemetry)
+        # the search walks this single copy in place, a timeout may leave it mid-line
+        return self.deepen(env.clone(), agent_id)
+
+    # start_time is a time.perf_counter() reading
+    def begin_turn(self, env: WarehouseEnv, start_time, time_limit):
+        self.start_time = start_time
         self.time_limit = time_limit
-
-        operator = 'park'
+        self.deadline = start_time + time_limit - self.time_margin
+        self.next_check = 0
+        self.nodes = 0
+        self.cutoffs = 0
+        self.root_scores = {}
+        if self.last_num_steps is None or env.num_steps >= self.last_num_steps:
+            self.tt.clear()
+        self.last_num_steps = env.num_steps
+        self.tt.new_search()
+        if self.tablebase is not None and not self.tablebase.loaded:
+            self.tablebase.load()
+
+    # a full collection walks every transposition table entry, a pause longer than time_margin, so the collector
+    # is held off until the search has returned
+    def deepen(self, env: WarehouseEnv, agent_id, operators=None, completed=None):
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self.iterative_deepening(env, agent_id, operators, completed)
+        finally:
+            if enabled:
+                gc.enable()
+
+    # iterative deepening over the given root operators (all legal ones by default), completed(depth, scores)
+    # is called after every depth that finished in time. it stops once every line reaches the end of the game or
+    # the next depth is not expected to finish in time
+    def iterative_deepening(self, env: WarehouseEnv, agent_id, operators=None, completed=None):
+        legal = operators if operators is not None else env.get_legal_operators(agent_id)
+        # what a depth 0 search that runs out of time returns
+        operator = legal[0]
+        self.aborted_depth = None
+        self.partial_result = False
+        # (nodes, seconds) of every completed depth
+        costs = []
         D = 0
         while True:
+            start, nodes = time.perf_counter(), self.nodes
             try:
-                operator = self.search(env, agent_id, D)
-                D += 1
-
+                operator = self.search(env, agent_id, D, operators)
             except TimeoutError:
+                self.aborted_depth = D
+                return self.partial_operator(legal, operator) if costs else operator
+            costs.append((self.nodes - nodes, time.perf_counter() - start))
+            if completed is not None:
+                completed(D, self.root_scores)
+            # the root operator and D more plies cover the rest of the game
+            if D + 1 >= env.num_steps:
                 return operator
-    
-    def search(self, env: WarehouseEnv, agent_id: int, depth:int):
+            if not self.next_depth_fits(costs, len(legal)):
+                return operator
+            D += 1
+
+    # the next depth costs about the last one times the branching factor measured between the last two. a depth
+    # that runs out of time is still used once it has searched the first root operator, see partial_operator
+    def next_depth_fits(self, costs, root_count):
+        if len(costs) < 2:
+            return True
+        nodes, seconds = costs[-1]
+        # the transposition table makes the first depths of a turn nearly free, so the measured factor is capped
+        # at the most legal operators a position can have
+        predicted = seconds * min(nodes / max(costs[-2][0], 1), 6)
+        return time.perf_counter() + predicted / root_count < self.deadline
+
+    # when a depth runs out of time after searching the previous depth's choice, the best of the root operators
+    # it finished is at least as good as that choice
+    def partial_operator(self, operators, operator):
+        scores = self.iteration_scores
+        if operator not in scores:
+            return operator
+        self.partial_result = True
+        return self.select_operator([op for op in operators if op in scores], scores)
+
+    # the previous depth's choice first, the rest by their previous values
+    def root_order(self, operators):
+        if not self.root_scores:
+            return operators
+        return sorted(operators, key=lambda op: self.root_scores.get(op, -math.inf), reverse=True)
+
+    def search(self, env: WarehouseEnv, agent_id: int, depth:int, operators=None):
         raise NotImplementedError
 
+    # ties go to the first operator in legal order
+    def select_operator(self, operators, scores):
+        children_heuristics = [scores[op] for op in operators]
+        max_heuristic = max(children_heuristics)
+        index_selected = children_heuristics.index(max_heuristic)
+        return operators[index_selected]
+
+    # searches every position the opponent can leave us in, one depth at a time, until interrupted() is true.
+    # the next turn's search then finds its subtrees in the transposition table. with more than two robots our
+    # next turn is several replies away, too many positions to ponder each
+    def ponder(self, env: WarehouseEnv, agent_id, interrupted):
+        if len(env.robots) != 2:
+            return
+        self.begin_turn(env, time.perf_counter(), math.inf)
+        self.interrupt = interrupted
+        other_id = (agent_id + 1) % 2
+        roots = []
+        for op in env.get_legal_operators(other_id):
+            root = env.clone()
+            root.apply_operator(other_id, op)
+            if not root.done():
+                roots.append([root, {}])
+        try:
+            for D in range(env.num_steps - 1):
+                for root in roots:
+                    self.root_scores = root[1]
+                    self.search(root[0], agent_id, D)
+                    root[1] = self.root_scores
+        except TimeoutError:
+            pass
+        finally:
+            self.interrupt = None
+
+    # called once the opponent has moved
+    def stop_pondering(self):
+        if self.pondering and self.pool is not None:
+            self.pool.stop()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    # the same position is valued differently depending on whose turn it is and on whose behalf we search
+    def tt_key(self, env: WarehouseEnv, agent_id, turn):
+        return env.zobrist ^ zobrist_key('turn', agent_id, turn)
+
+    # fail-soft: a value outside the window searched is itself a bound on the true value
+    def store_bound(self, key, depth, value, alpha, beta, best_op):
+        if value <= alpha:
+            self.tt.store(key, depth, value, UPPER, best_op)
+        elif value >= beta:
+            self.tt.store(key, depth, value, LOWER, best_op)
+        else:
+            self.tt.store(key, depth, value, EXACT, best_op)
+
 
 class AgentMinimax(RBAgent):
+    # batch_evaluation None batches when numpy is available
+    def __init__(self, workers=1, ponder=False, batch_evaluation=None):
+        if batch_evaluation is None:
+            batch_evaluation = BatchEvaluation.available()
+        super().__init__(workers, ponder, batch_evaluation)
+
     # TODO: section b : 1
-    def search(self, env: WarehouseEnv, agent_id: int, depth: int):
-        operators = env.get_legal_operators(agent_id)
-        children = [env.clone() for _ in operators]
-        for child, op in zip(children, operators):
-            child.apply_operator(agent_id, op)
-        other_id = (agent_id + 1) % 2
-        children_heuristics = [self.RB_Minimax(child, agent_id, depth, turn=other_id) for child in children]
+    def search(self, env: WarehouseEnv, agent_id: int, depth: int, operators=None):
+        partial = operators is not None
+        if not partial:
+            operators = env.get_legal_operators(agent_id)
+        other_id = (agent_id + 1) % len(env.robots)
+        scores = self.iteration_scores = {}
+        for op in self.root_order(operators):
+            record = env.apply_code(agent_id, operator_code(op))
+            scores[op] = self.RB_Minimax(env, agent_id, depth, turn=other_id)
+            env.undo_operator(record)
+        self.root_scores = scores
+        operator = self.select_operator(operators, scores)
+        if not partial:
+            self.tt.store(self.tt_key(env, agent_id, agent_id), depth + 1, scores[operator], EXACT,
+                          operator_code(operator))
+        return operator
+
+    def select_operator(self, operators, scores):
+        children_heuristics = [scores[op] for op in operators]
         max_heuristic = max(children_heuristics)
         possible_moves = [i for i, c in enumerate(children_heuristics) if c == max_heuristic]
-        operator = operators[random.choice(possible_moves)]
-        return operator
+        return operators[random.choice(possible_moves)]
     
     def RB_Minimax(self, env: WarehouseEnv, agent_id, depth, turn):
         self.check_time()
@@ -93,127 +366,579 @@ class AgentMinimax(RBAgent):
         if env.done() or depth == 0:
             return self.heuristic(env, agent_id)
 
-        operators = env.get_legal_operators(turn)
-        children = [env.clone() for _ in operators]
+        key = self.tt_key(env, agent_id, turn)
+        entry = self.tt.probe(key)
+        if entry is not None and entry[1] >= depth and entry[3] == EXACT:
+            return entry[2]
 
-        for child, op in zip(children, operators):
-            child.apply_operator(turn, op)
+        operators = env.get_legal_codes(turn)
+        leaves = self.leaf_values(env, agent_id, turn, operators) if depth == 1 else None
+        best_op = None
 
         if turn == agent_id:
             curr_max = -math.inf
-            for c in children:
-                v = self.RB_Minimax(c, agent_id, depth - 1, (turn + 1) % 2)
-                curr_max = max(v, curr_max)
+            for i, op in enumerate(operators):
+                if leaves is not None:
+                    v = leaves[i]
+                else:
+                    record = env.apply_code(turn, op)
+                    v = self.RB_Minimax(env, agent_id, depth - 1, (turn + 1) % len(env.robots))
+                    env.undo_operator(record)
+                if best_op is None or v > curr_max:
+                    curr_max, best_op = v, op
+            self.tt.store(key, depth, curr_max, EXACT, best_op)
             return curr_max
 
         else:
             curr_min = math.inf
-            for c in children:
-                v = self.RB_Minimax(c, agent_id, depth - 1, (turn + 1) % 2)
-                curr_min = min(v, curr_min)
+            for i, op in enumerate(operators):
+                if leaves is not None:
+                    v = leaves[i]
+                else:
+                    record = env.apply_code(turn, op)
+                    v = self.RB_Minimax(env, agent_id, depth - 1, (turn + 1) % len(env.robots))
+                    env.undo_operator(record)
+                if best_op is None or v < curr_min:
+                    curr_min, best_op = v, op
+            self.tt.store(key, depth, curr_min, EXACT, best_op)
             return curr_min
 
 
 class AgentAlphaBeta(RBAgent):
+    def __init__(self, move_ordering=True, workers=1, ponder=False, pvs=True, packed=False):
+        super().__init__(workers, ponder)
+        self.move_ordering = move_ordering
+        # search games on the default layout on their PackedState ints instead of a WarehouseEnv
+        self.packed = packed
+        self.robot_count = None
+        # principal variation search: every child but the first is searched with a null window, and again with
+        # the full window only when it turns out better
+        self.pvs = pvs
+        self.search_depth = None
+        # ply -> the last two operators that caused a cutoff there
+        self.killers = {}
+        # (turn, cell, operator) -> how much cutting off with it has been worth
+        self.history = {}
+
+    def begin_turn(self, env: WarehouseEnv, start_time, time_limit):
+        super().begin_turn(env, start_time, time_limit)
+        self.killers = {}
+        self.history = {k: v // 2 for k, v in self.history.items() if v > 1}
+
     # TODO: section c : 1
-    def search(self, env: WarehouseEnv, agent_id, depth):
-        operators = env.get_legal_operators(agent_id)
-        children = [env.clone() for _ in operators]
-        for child, op in zip(children, operators):
-            child.apply_operator(agent_id, op)
-        other_id = (agent_id + 1) % 2
-        children_heuristics = [
-            self.RB_AlphaBeta(child, agent_id, depth, turn=other_id, alpha=-math.inf, beta=math.inf)
-            for child in children]
-        max_heuristic = max(children_heuristics)
-        index_selected = children_heuristics.index(max_heuristic)
-        operator = operators[index_selected]
+    def search(self, env: WarehouseEnv, agent_id, depth, operators=None):
+        partial = operators is not None
+        if not partial:
+            operators = env.get_legal_operators(agent_id)
+        self.robot_count = len(env.robots)
+        other_id = (agent_id + 1) % self.robot_count
+        self.search_depth = depth
+        # the batch evaluation reads the WarehouseEnv
+        if self.packed and not self.batch_evaluation and packable(env):
+            env = PackedEnv(pack_state(env))
+        ordered = self.root_order(operators) if self.move_ordering else operators
+        scores = self.iteration_scores = {}
+        best = -math.inf
+        for op in ordered:
+            record = env.apply_code(agent_id, operator_code(op))
+            if self.pvs and scores and not math.isinf(best):
+                v = self.scout_root(env, agent_id, depth, other_id, best)
+            else:
+                v = self.RB_AlphaBeta(env, agent_id, depth, turn=other_id, alpha=-math.inf, beta=math.inf)
+            env.undo_operator(record)
+            scores[op] = v
+            best = max(best, v)
+        self.root_scores = scores
+        # ties still go to the first operator in legal order, whatever order the children were searched in
+        operator = self.select_operator(operators, scores)
+        if not partial:
+            self.tt.store(self.tt_key(env, agent_id, agent_id), depth + 1, scores[operator], EXACT,
+                          operator_code(operator))
         return operator
 
+    # the value of a root operator other than the first: exact when it is within TIE_MARGIN of best or above it,
+    # so that ties still go to the first operator in legal order, and otherwise an upper bound below best
+    def scout_root(self, env: WarehouseEnv, agent_id, depth, turn, best):
+        v = self.RB_AlphaBeta(env, agent_id, depth, turn, best - TIE_MARGIN, best + TIE_MARGIN)
+        if v >= best + TIE_MARGIN:
+            v = self.RB_AlphaBeta(env, agent_id, depth, turn, best - TIE_MARGIN, math.inf)
+            # the transposition table may contradict the scout, then nothing is assumed
+            if v <= best - TIE_MARGIN:
+                v = self.RB_AlphaBeta(env, agent_id, depth, turn, -math.inf, math.inf)
+        return v
+
+    # a packed position is unpacked only where utility or the endgame table decide its value
+    def heuristic(self, env: WarehouseEnv, agent_id: int):
+        if type(env) is not PackedEnv:
+            return super().heuristic(env, agent_id)
+        if env.done() or (self.tablebase is not None and env.num_steps <= self.tablebase.max_steps):
+            return super().heuristic(env.unpack(), agent_id)
+        return packed_heuristic(env.state, agent_id) - packed_heuristic(env.state, 1 - agent_id)
+
+    # transposition table move first, then this ply's killers, then the rest by history score
+    def order_operators(self, env: WarehouseEnv, operators, turn, tt_move, ply):
+        killers = self.killers.get(ply, ())
+        cell = env.robot_cell(turn)
+        history = self.history
+
+        def score(op):
+            if op == tt_move:
+                return math.inf
+            if op in killers:
+                return 1e12 - killers.index(op)
+            return history.get((turn, cell, op), 0)
+
+        return sorted(operators, key=score, reverse=True)
+
+    def record_cutoff(self, env: WarehouseEnv, op, turn, depth, ply):
+        killers = self.killers.setdefault(ply, [])
+        if op not in killers:
+            killers.insert(0, op)
+            del killers[2:]
+        key = (turn, env.robot_cell(turn), op)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
     def RB_AlphaBeta(self, env: WarehouseEnv, agent_id, depth, turn, alpha, beta):
         self.check_time()
 
         if env.done() or depth == 0:
             return self.heuristic(env, agent_id)
 
-        operators = env.get_legal_operators(turn)
-        children = [env.clone() for _ in operators]
-
-        for child, op in zip(children, operators):
-            child.apply_operator(turn, op)
-
+        key = self.tt_key(env, agent_id, turn)
+        entry = self.tt.probe(key)
+        if entry is not None and entry[1] >= depth:
+            value, bound = entry[2], entry[3]
+            if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+                return value
+
+        operators = env.get_legal_codes(turn)
+        ply = self.search_depth - depth
+        if self.move_ordering:
+            operators = self.order_operators(env, operators, turn, entry[4] if entry is not None else None, ply)
+        leaves = self.leaf_values(env, agent_id, turn, operators) if depth == 1 else None
+        alpha_orig, beta_orig = alpha, beta
+        other_id = (turn + 1) % self.robot_count
+        best_op = None
+
+        # fail-soft: a cutoff returns the value that caused it, which bounds the true value
         if turn == agent_id:
             curr_max = -math.inf
-            for c in children:
-                v = self.RB_AlphaBeta(c, agent_id, depth - 1, (turn + 1) % 2, alpha, beta)
-                curr_max = max(v, curr_max)
+            for i, op in enumerate(operators):
+                if leaves is not None:
+                    v = leaves[i]
+                else:
+                    record = env.apply_code(turn, op)
+                    if i == 0 or not self.pvs or math.isinf(alpha):
+                        v = self.RB_AlphaBeta(env, agent_id, depth - 1, other_id, alpha, beta)
+                    else:
+                        v = self.RB_AlphaBeta(env, agent_id, depth - 1, other_id, alpha, alpha + TIE_MARGIN)
+                        if alpha + TIE_MARGIN <= v < beta:
+                            v = self.RB_AlphaBeta(env, agent_id, depth - 1, other_id, alpha, beta)
+                    env.undo_operator(record)
+                if best_op is None or v > curr_max:
+                    curr_max, best_op = v, op
                 alpha = max(curr_max, alpha)
                 if curr_max >= beta:
-                    return math.inf
+                    self.cutoffs += 1
+                    if self.move_ordering:
+                        self.record_cutoff(env, op, turn, depth, ply)
+                    self.tt.store(key, depth, curr_max, LOWER, best_op)
+                    return curr_max
+            self.store_bound(key, depth, curr_max, alpha_orig, beta_orig, best_op)
             return curr_max
 
         else:
             curr_min = math.inf
-            for c in children:
-                v = self.RB_AlphaBeta(c, agent_id, depth - 1, (turn + 1) % 2, alpha, beta)
-                curr_min = min(v, curr_min)
+            for i, op in enumerate(operators):
+                if leaves is not None:
+                    v = leaves[i]
+                else:
+                    record = env.apply_code(turn, op)
+                    if i == 0 or not self.pvs or math.isinf(beta):
+                        v = self.RB_AlphaBeta(env, agent_id, depth - 1, other_id, alpha, beta)
+                    else:
+                        v = self.RB_AlphaBeta(env, agent_id, depth - 1, other_id, beta - TIE_MARGIN, beta)
+                        if alpha < v <= beta - TIE_MARGIN:
+                            v = self.RB_AlphaBeta(env, agent_id, depth - 1, other_id, alpha, beta)
+                    env.undo_operator(record)
+                if best_op is None or v < curr_min:
+                    curr_min, best_op = v, op
                 beta = min(curr_min, beta)
                 if curr_min <= alpha:
-                    return -math.inf
+                    self.cutoffs += 1
+                    if self.move_ordering:
+                        self.record_cutoff(env, op, turn, depth, ply)
+                    self.tt.store(key, depth, curr_min, UPPER, best_op)
+                    return curr_min
+            self.store_bound(key, depth, curr_min, alpha_orig, beta_orig, best_op)
             return curr_min
 
 
 class AgentExpectimax(RBAgent):
+    # batch_evaluation None batches when numpy is available
+    def __init__(self, pruning=True, workers=1, ponder=False, batch_evaluation=None):
+        if batch_evaluation is None:
+            batch_evaluation = BatchEvaluation.available()
+        super().__init__(workers, ponder, batch_evaluation)
+        # Star1 cutoffs at chance nodes within the bounds value_bounds derives. the values of the root operators
+        # are the same either way
+        self.pruning = pruning
+
     # TODO: section d : 1
-    def search(self, env: WarehouseEnv, agent_id, depth):
-        operators = env.get_legal_operators(agent_id)
-        children = [env.clone() for _ in operators]
-        for child, op in zip(children, operators):
-            child.apply_operator(agent_id, op)
-        other_id = (agent_id + 1) % 2
-        children_heuristics = \
-            [self.RB_Expectimax(child, agent_id, depth, turn=other_id)
-            for child in children]
-        max_heuristic = max(children_heuristics)
-        index_selected = children_heuristics.index(max_heuristic)
-        operator = operators[index_selected]
+    def search(self, env: WarehouseEnv, agent_id, depth, operators=None):
+        partial = operators is not None
+        if not partial:
+            operators = env.get_legal_operators(agent_id)
+        other_id = (agent_id + 1) % len(env.robots)
+        scores = self.iteration_scores = {}
+        best = -math.inf
+        for op in self.root_order(operators):
+            record = env.apply_code(agent_id, operator_code(op))
+            if self.pruning:
+                v = self.RB_Expectimax(env, agent_id, depth, other_id, best, math.inf)
+                # a value that only bounds an operator close to the best could hide a tie, which goes to the first
+                # operator in legal order
+                if best - TIE_MARGIN < v <= best:
+                    v = self.RB_Expectimax(env, agent_id, depth, other_id)
+            else:
+                v = self.RB_Expectimax(env, agent_id, depth, other_id)
+            env.undo_operator(record)
+            scores[op] = v
+            best = max(best, v)
+        self.root_scores = scores
+        operator = self.select_operator(operators, scores)
+        if not partial:
+            self.tt.store(self.tt_key(env, agent_id, agent_id), depth + 1, scores[operator], EXACT,
+                          operator_code(operator))
         return operator
-    
-    def RB_Expectimax(self, env: WarehouseEnv, agent_id, depth, turn):
+
+    # fail-soft: a value at most alpha is an upper bound on the true value, one at least beta a lower bound
+    def RB_Expectimax(self, env: WarehouseEnv, agent_id, depth, turn, alpha=-math.inf, beta=math.inf):
         self.check_time()
 
         if env.done() or depth == 0:
             return self.heuristic(env, agent_id)
-        
-        other_id = (turn + 1) % 2
-        
-        operators = env.get_legal_operators(turn)
-        children = [env.clone() for _ in operators]
 
-        for child, op in zip(children, operators):
-            child.apply_operator(turn, op)
+        key = self.tt_key(env, agent_id, turn)
+        entry = self.tt.probe(key)
+        if entry is not None and entry[1] >= depth:
+            value, bound = entry[2], entry[3]
+            if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+                return value
+
+        other_id = (turn + 1) % len(env.robots)
+
+        operators = env.get_legal_codes(turn)
+        leaves = self.leaf_values(env, agent_id, turn, operators) if depth == 1 else None
 
         if turn == agent_id:
+            if self.pruning and leaves is None and entry is not None and entry[4] in operators:
+                operators.remove(entry[4])
+                operators.insert(0, entry[4])
+            alpha_orig = alpha
             curr_max = -math.inf
-            for c in children:
-                v = self.RB_Expectimax(c, agent_id, depth - 1, other_id)
-                curr_max = max(v, curr_max)
+            best_op = None
+            for i, op in enumerate(operators):
+                if leaves is not None:
+                    v = leaves[i]
+                else:
+                    record = env.apply_code(turn, op)
+                    v = self.RB_Expectimax(env, agent_id, depth - 1, other_id, alpha, beta)
+                    env.undo_operator(record)
+                if best_op is None or v > curr_max:
+                    curr_max, best_op = v, op
+                alpha = max(alpha, curr_max)
+                if curr_max >= beta:
+                    self.cutoffs += 1
+                    self.tt.store(key, depth, curr_max, LOWER, best_op)
+                    return curr_max
+            self.store_bound(key, depth, curr_max, alpha_orig, beta, best_op)
             return curr_max
 
         else:
+            # the mover is not other_id, so its cell is the same in every child, and holds at most one station
             probs = [1] * len(operators)
-            for i, (c, op) in enumerate(zip(children, operators)):
-                stations = [station.position for station in c.charge_stations]
-                if op != 'charge' and c.get_robot(other_id).position in stations:
-                    probs[i] += sum([c.get_robot(other_id).position == s for s in stations])
+            on_station = env.station_at[env.robots[other_id].cell] is not None
+            for i, op in enumerate(operators):
+                if op != CHARGE and on_station:
+                    probs[i] += 1
             total_sum = sum(probs)
             probs = [p / total_sum for p in probs]
-            
+
+            bounds = self.value_bounds(env, agent_id, depth, turn) \
+                if self.pruning and leaves is None and (alpha > -math.inf or beta < math.inf) else None
+            if bounds is not None:
+                return self.pruned_chance(env, agent_id, depth, turn, alpha, beta, key, operators, probs, bounds)
+
             v = 0
-            for c, p in zip(children, probs):
-                v += p * self.RB_Expectimax(c, agent_id, depth - 1, other_id)
-            
-            return v / len(children)
+            for i, (op, p) in enumerate(zip(operators, probs)):
+                if leaves is not None:
+                    v += p * leaves[i]
+                    continue
+                record = env.apply_code(turn, op)
+                v += p * self.RB_Expectimax(env, agent_id, depth - 1, other_id)
+                env.undo_operator(record)
+
+            self.tt.store(key, depth, v, EXACT, None)
+            return v
+
+    # Star1: with every child's value within bounds, the children searched so far bound the chance node's value,
+    # and each child is searched with the window that decides whether the node falls outside (alpha, beta)
+    def pruned_chance(self, env: WarehouseEnv, agent_id, depth, turn, alpha, beta, key, operators, probs, bounds):
+        lower, upper = bounds
+        other_id = (turn + 1) % len(env.robots)
+        v = 0
+        # probability of the children not searched yet
+        rest = 1.0
+        for op, p in zip(operators, probs):
+            rest -= p
+            child_alpha = (alpha - v - rest * upper) / p
+            child_beta = (beta - v - rest * lower) / p
+            if child_alpha >= upper:
+                return self.chance_cutoff(key, depth, min(v + (p + rest) * upper, alpha), UPPER)
+            if child_beta <= lower:
+                return self.chance_cutoff(key, depth, max(v + (p + rest) * lower, beta), LOWER)
+            record = env.apply_code(turn, op)
+            value = self.RB_Expectimax(env, agent_id, depth - 1, other_id, child_alpha, child_beta)
+            env.undo_operator(record)
+            if value <= child_alpha:
+                return self.chance_cutoff(key, depth, min(v + p * value + rest * upper, alpha), UPPER)
+            if value >= child_beta:
+                return self.chance_cutoff(key, depth, max(v + p * value + rest * lower, beta), LOWER)
+            v += p * value
+
+        self.tt.store(key, depth, v, EXACT, None)
+        return v
+
+    def chance_cutoff(self, key, depth, value, bound):
+        self.cutoffs += 1
+        self.tt.store(key, depth, value, bound, None)
+        return value
+
+    # bounds on every value heuristic() can give the positions up to plies moves below env, with turn to move.
+    # None when one of them may end the game or be in the endgame table, whose values are infinite
+    def value_bounds(self, env: WarehouseEnv, agent_id, plies, turn):
+        if env.num_steps <= plies:
+            return None
+        if self.tablebase is not None and self.tablebase.may_contain(env, plies):
+            return None
+        robots = env.robots
+        count = len(robots)
+        # how many of the plies each robot moves in
+        moves = [(plies - (i - turn) % count + count - 1) // count for i in range(count)]
+        if all(robot.battery <= m for robot, m in zip(robots, moves)):
+            return None
+        distance = env.board.distance
+        # a drop off spawns a package anywhere, it takes a robot that carries one to its destination, or three
+        # moves to pick up, move and drop off
+        spawn = any(m >= 3 or (robot.package is not None
+                               and distance[robot.cell][robot.package.destination_cell] < m)
+                    for robot, m in zip(robots, moves))
+        # the robots that may pick up a package
+        pickers = [robot.package is None and (spawn or env.package_distance[robot.cell] < m)
+                   for robot, m in zip(robots, moves)]
+        bounds = [self.smart_bounds(env, robot, m, spawn, pickers[i], any(pickers[:i] + pickers[i + 1:]))
+                  for i, (robot, m) in enumerate(zip(robots, moves))]
+        low, high = bounds[agent_id]
+        rivals = bounds[:agent_id] + bounds[agent_id + 1:]
+        return low - max(bound[1] for bound in rivals), high - max(bound[0] for bound in rivals)
+
+    # bounds on smart_heuristic for a robot that makes up to m more moves, of which each changes a distance by at
+    # most one. picks tells whether it may pick up a package, and taken whether another robot may
+    def smart_bounds(self, env: WarehouseEnv, robot, m, spawn, picks, taken):
+        distance = env.board.distance
+        longest = 2 * (env.board.size - 1)
+        credit_low = credit_high = robot.credit
+        package = robot.package
+        if package is not None:
+            to_destination = distance[robot.cell][package.destination_cell]
+            extra = distance[package.cell][package.destination_cell] - to_destination + 100
+            extra_low, extra_high = extra - m, extra + m
+            if to_destination < m:
+                # delivered, then heading for or carrying another package. a delivery pays at most twice the
+                # longest distance
+                credit_high += 2 * distance[package.cell][package.destination_cell] \
+                    + (m - to_destination - 1) // 3 * 2 * longest
+                extra_low, extra_high = min(extra_low, -longest), max(extra_high, 100 + m)
+        else:
+            # the nearest package only gets farther when another robot takes it, and nearer when one spawns
+            target = env.package_distance[robot.cell]
+            extra_low = -longest if taken or spawn else max(-target - m, -longest)
+            extra_high = 0 if taken or spawn else min(m - target, 0)
+            if picks:
+                # a package just picked up is worth 100 and its destination gets at most one closer per move
+                extra_low, extra_high = min(extra_low, 100 - m), max(extra_high, 100 + m)
+                if m >= 3:
+                    credit_high += m // 3 * 2 * longest
+                    extra_low = -longest
+        if credit_high > 0 and any(distance[robot.cell][env.board.cell_of[station.position]] < m
+                                   for station in env.charge_stations):
+            credit_low = 0
+        return credit_low * 1000 + extra_low, credit_high * 1000 + extra_high
+
+
+# a position in AgentMCTS's tree, reached by robot mover applying code. total is the reward the mover collected
+# over the visits through it, so every robot picks its own best child
+class MCTSNode(object):
+    def __init__(self, mover, code, key):
+        self.mover = mover
+        self.code = code
+        self.key = key
+        self.visits = 0
+        self.total = 0.0
+        self.children = []
+        # the legal codes not expanded yet, last one next, None until the node is first visited
+        self.untried = None
+
+
+# UCT over the robots' moves with short greedy rollouts. the search walks a single copy of the position with
+# apply_code and undo_operator, and the tree is kept between turns: the next turn starts from the node the moves
+# played since lead to
+class AgentMCTS(Agent):
+    def __init__(self, exploration=1.4, rollout_depth=40, epsilon=0.1, seed=0):
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        # the rollout policy plays a random operator this often
+        self.epsilon = epsilon
+        # a smart_heuristic lead of reward_scale is worth a reward of about 0.88 out of 1
+        self.reward_scale = 1000
+        self.time_margin = 2e-2
+        self.random = random.Random(seed)
+        self.root = None
+        # called with a dict describing every turn, see SearchTelemetry
+        self.telemetry = None
+        self.iterations = 0
+        self.iterations_per_second = 0.0
+
+    def run_step(self, env: WarehouseEnv, agent_id, time_limit):
+        start = time.perf_counter()
+        deadline = start + time_limit - self.time_margin
+        root = self.reroot(env, agent_id)
+        reused = root.visits
+        search_env = env.clone()
+        iterations = 0
+        while time.perf_counter() < deadline:
+            self.iterate(search_env, root)
+            iterations += 1
+        seconds = time.perf_counter() - start
+        self.iterations = iterations
+        self.iterations_per_second = iterations / seconds if seconds > 0 else 0.0
+        if root.children:
+            # the most visited child, ties go to the first operator in legal order
+            operator = operator_name(max(root.children, key=lambda child: child.visits).code)
+        else:
+            operator = operator_name(env.get_legal_codes(agent_id)[0])
+        if self.telemetry is not None:
+            self.telemetry({'agent': type(self).__name__, 'robot': agent_id, 'num_steps': env.num_steps,
+                            'time_limit': time_limit, 'operator': operator, 'iterations': iterations,
+                            'iterations_per_second': self.iterations_per_second, 'reused_visits': reused,
+                            'root_visits': root.visits, 'seconds': seconds})
+        return operator
+
+    # the node of the last turn's tree that the moves played since lead to, or a new root. every robot has moved
+    # once since, so it is that many plies below the last root
+    def reroot(self, env: WarehouseEnv, agent_id):
+        root = None
+        if self.root is not None:
+            root = self.find(self.root, env.zobrist, len(env.robots))
+        if root is None:
+            root = MCTSNode((agent_id - 1) % len(env.robots), None, env.zobrist)
+        self.root = root
+        return root
+
+    def find(self, node, key, plies):
+        if node.key == key:
+            return node
+        if plies > 0:
+            for child in node.children:
+                found = self.find(child, key, plies - 1)
+                if found is not None:
+                    return found
+        return None
+
+    # one selection, expansion, rollout and backpropagation, leaving env as it was
+    def iterate(self, env: WarehouseEnv, root):
+        robots = len(env.robots)
+        node = root
+        path = [node]
+        records = []
+        while node.untried is not None and not node.untried:
+            node = self.select_child(node)
+            records.append(env.apply_code(node.mover, node.code))
+            path.append(node)
+        if not env.done():
+            turn = (node.mover + 1) % robots
+            if node.untried is None:
+                node.untried = env.get_legal_codes(turn)[::-1]
+            code = node.untried.pop()
+            records.append(env.apply_code(turn, code))
+            child = MCTSNode(turn, code, env.zobrist)
+            node.children.append(child)
+            path.append(child)
+            node = child
+        rewards = self.rollout(env, (node.mover + 1) % robots)
+        for record in reversed(records):
+            env.undo_operator(record)
+        for node in path:
+            node.visits += 1
+            node.total += rewards[node.mover]
+
+    # UCT from the point of view of the robot moving at node
+    def select_child(self, node):
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+        return max(node.children, key=lambda child: child.total / child.visits
+                   + exploration * math.sqrt(log_visits / child.visits))
+
+    # plays the default policy for up to rollout_depth plies from turn's move and returns every robot's reward
+    def rollout(self, env: WarehouseEnv, turn):
+        robots = len(env.robots)
+        records = []
+        for _ in range(self.rollout_depth):
+            if env.done():
+                break
+            records.append(env.apply_code(turn, self.default_code(env, turn)))
+            turn = (turn + 1) % robots
+        rewards = self.rewards(env)
+        for record in reversed(records):
+            env.undo_operator(record)
+        return rewards
+
+    # AgentGreedyImproved's choice without applying every operator: drop off, then pick up, then the move that
+    # gets closest to the robot's target. a random operator with probability epsilon
+    def default_code(self, env: WarehouseEnv, turn):
+        codes = env.get_legal_codes(turn)
+        if self.random.random() < self.epsilon:
+            return self.random.choice(codes)
+        if DROP_OFF in codes:
+            return DROP_OFF
+        if PICK_UP in codes:
+            return PICK_UP
+        robot = env.robots[turn]
+        if robot.package is not None:
+            distance = env.board.distance[robot.package.destination_cell]
+        else:
+            distance = env.package_distance
+        best, best_distance = codes[0], math.inf
+        for code, cell in env.board.moves[robot.cell]:
+            if distance[cell] < best_distance and code in codes:
+                best, best_distance = code, distance[cell]
+        return best
+
+    # rewards in [0, 1]: the result of a finished game, otherwise every robot's smart_heuristic lead over the best
+    # of the others through a logistic curve
+    def rewards(self, env: WarehouseEnv):
+        if env.done():
+            credits = env.get_balances()
+            best = max(credits)
+            winner = 1.0 if credits.count(best) == 1 else 0.5
+            return [winner if credit == best else 0.0 for credit in credits]
+        scores = [smart_heuristic(env, i) for i in range(len(env.robots))]
+        rewards = []
+        for i, score in enumerate(scores):
+            lead = score - max(scores[:i] + scores[i + 1:])
+            rewards.append(0.5 + 0.5 * math.tanh(lead / (2 * self.reward_scale)))
+        return rewards
 
 
 # here you can check specific paths to get to know the environment
@@ -235,6 +960,6 @@ class AgentHardCoded(Agent):
             return op
 
     def run_random_step(self, env: WarehouseEnv, robot_id, time_limit):
-        operators, _ = self.successors(env, robot_id)
+        operators = env.get_legal_operators(robot_id)
 
         return random.choice(operators)